@@ -7,11 +7,22 @@ exponential moving averages, and neuroscience-backed intervention strategies.
 from __future__ import annotations
 
 import math
-from datetime import datetime
+import sys
+import time
 from typing import Any
 
-from state import CognitiveState, CrashPrediction, InteractionMetrics
-from utils.metrics import detect_trend, should_suggest_break
+import numpy as np
+
+try:
+    from numba import njit
+except ImportError:  # numba is optional — the kernel then runs as plain NumPy
+    def njit(*args, **kwargs):
+        if len(args) == 1 and callable(args[0]):
+            return args[0]
+        return lambda fn: fn
+
+from state import CognitiveState, InteractionMetrics
+from utils.metrics import iso_timestamp, should_suggest_break
 
 
 # ── Weighted Scoring Configuration (from README spec) ──
@@ -25,206 +36,433 @@ WEIGHTS = {
     "session_duration": 0.10,        # Sigmoid fatigue curve
 }
 
-
-def _exponential_moving_avg(values: list[float], alpha: float = 0.3) -> float:
-    """Compute exponential weighted moving average — recent values weigh more."""
-    if not values:
-        return 0.0
-    ema = values[0]
-    for v in values[1:]:
-        ema = alpha * v + (1 - alpha) * ema
-    return ema
-
-
-def _compute_crash_score(metrics: InteractionMetrics, session_minutes: float) -> dict:
+# Fixed factor order shared by the kernel output and the weight vector. It is
+# the order the original factors dict was filled in, which the critical-warning
+# evidence list follows. Interned so factor-dict lookups hit the identity fast path.
+_FACTOR_KEYS = tuple(sys.intern(k) for k in (
+    "typing_speed_decline",
+    "message_length_trend",
+    "response_time_trend",
+    "session_duration",
+    "break_overdue",
+    "topic_drift",
+))
+_SESSION_IDX = _FACTOR_KEYS.index("session_duration")
+_BREAK_IDX = _FACTOR_KEYS.index("break_overdue")
+_TOPIC_DRIFT_IDX = _FACTOR_KEYS.index("topic_drift")
+_WEIGHTS_VEC = np.array([WEIGHTS[k] for k in _FACTOR_KEYS], dtype=np.float64)
+
+# Session-duration sigmoid 1/(1+exp(-(m-90)/20)), written via the identity
+# 0.5*(tanh((m-90)/40)+1). Sampled every 0.5 min over [0, 300) minutes;
+# sessions past the table evaluate the tanh form directly.
+_SIGMOID_STEP = 0.5
+_SIGMOID_LUT = 0.5 * (np.tanh((np.arange(600) * _SIGMOID_STEP - 90.0) / 40.0) + 1.0)
+
+
+# Closed-form EMA weight vectors, keyed by (window length, alpha)
+_EMA_WEIGHTS: dict[tuple[int, float], np.ndarray] = {}
+
+
+def _ema_weights(n: int, alpha: float = 0.3) -> np.ndarray:
+    """Geometric weights w such that ``w @ x`` equals the recursive EMA of x."""
+    key = (n, alpha)
+    w = _EMA_WEIGHTS.get(key)
+    if w is None:
+        w = np.empty(n, dtype=np.float64)
+        w[-1] = alpha
+        w[:-1] = alpha * (1 - alpha) ** np.arange(n - 1, 0, -1)
+        w[0] = (1 - alpha) ** (n - 1)   # seed value carries the remaining mass
+        w.flags.writeable = False
+        _EMA_WEIGHTS[key] = w
+    return w
+
+
+class CrashScore:
+    """Overall crash likelihood plus the clipped factor vector it came from.
+    The per-factor dict is only built if something asks for ``factors``."""
+
+    __slots__ = ("overall", "vec", "msg_emas", "_dict")
+
+    def __init__(self, overall: float, vec: np.ndarray, msg_emas: tuple[float, float]):
+        self.overall = overall
+        self.vec = vec
+        self.msg_emas = msg_emas      # (recent message-length EMA, overall mean)
+        self._dict = None
+
+    @property
+    def factors(self) -> dict[str, float]:
+        if self._dict is None:
+            self._dict = dict(zip(_FACTOR_KEYS, self.vec.tolist()))
+        return self._dict
+
+
+@njit(cache=True, fastmath=True, error_model="numpy")
+def _compute_crash_score_kernel(
+    current_speed: float,
+    baseline_speed: float,
+    msg_lens: np.ndarray,
+    msg_mean: float,
+    resp_times: np.ndarray,
+    w_msg_recent: np.ndarray,
+    w_resp: np.ndarray,
+    session_minutes: float,
+    mins_since_break: int,
+    needs_break: bool,
+) -> tuple:
     """
-    Multi-factor weighted crash likelihood scoring.
-    Returns dict with overall score and per-factor breakdown.
+    Pure-numeric crash factors as a vector in _FACTOR_KEYS order, plus the
+    recent message-length EMA (equal to msg_mean when there is too little data).
+    Each factor is written unclamped; one np.clip bounds them all to [0, 1].
+    EMA windows are dotted with the precomputed weights from _ema_weights().
     """
-    factors = {}
+    factor_vec = np.zeros(6)
+    msg_ema_recent = msg_mean
 
     # Factor 1: Typing speed decline from baseline
-    if metrics.typing_speed_baseline > 0 and metrics.current_typing_speed > 0:
-        speed_ratio = metrics.current_typing_speed / metrics.typing_speed_baseline
-        # 1.0 = no decline, 0.5 = 50% decline
-        factors["typing_speed_decline"] = max(0, 1.0 - speed_ratio)
-    else:
-        factors["typing_speed_decline"] = 0.0
+    # 1.0 = no decline, 0.5 = 50% decline
+    if baseline_speed > 0 and current_speed > 0:
+        factor_vec[0] = 1.0 - current_speed / baseline_speed
 
     # Factor 2: Message length trend (EMA-based)
-    if len(metrics.message_lengths) >= 3:
-        lengths = [float(l) for l in metrics.message_lengths]
-        ema_recent = _exponential_moving_avg(lengths[-5:])
-        ema_overall = sum(lengths) / len(lengths)
-        if ema_overall > 0:
-            decline = max(0, 1.0 - (ema_recent / ema_overall))
-            factors["message_length_trend"] = min(decline * 2, 1.0)  # amplify signal
-        else:
-            factors["message_length_trend"] = 0.0
-    else:
-        factors["message_length_trend"] = 0.0
+    if msg_lens.size >= 3:
+        msg_ema_recent = (w_msg_recent * msg_lens[-5:]).sum()
+        if msg_mean > 0:
+            factor_vec[1] = (1.0 - msg_ema_recent / msg_mean) * 2  # amplify signal
 
     # Factor 3: Response time trend (increasing = fatigue signal)
-    if len(metrics.response_times) >= 3:
-        times = metrics.response_times[-8:]
-        ema_recent = _exponential_moving_avg(times[-3:])
-        ema_early = _exponential_moving_avg(times[:3])
+    if resp_times.size >= 3:
+        times = resp_times[-8:]
+        ema_recent = (w_resp * times[-3:]).sum()
+        ema_early = (w_resp * times[:3]).sum()
         if ema_early > 0:
-            increase = max(0, (ema_recent - ema_early) / ema_early)
-            factors["response_time_trend"] = min(increase, 1.0)
-        else:
-            factors["response_time_trend"] = 0.0
-    else:
-        factors["response_time_trend"] = 0.0
+            factor_vec[2] = (ema_recent - ema_early) / ema_early
 
-    # Factor 4: Session duration fatigue curve (sigmoid around 90 min)
+    # Factor 4: Break overdue
+    if needs_break:
+        factor_vec[_BREAK_IDX] = (mins_since_break - 45) / 45
+
+    # Factor 5: Topic drift (proxy for executive function decline)
+    # High variance in recent message lengths suggests erratic engagement
+    if msg_lens.size >= 4:
+        factor_vec[_TOPIC_DRIFT_IDX] = msg_lens[-4:].var() / 5000
+
+    # Factor 6: Session duration fatigue curve (sigmoid around 90 min)
     if session_minutes > 0:
-        # Sigmoid: rises sharply around 90 minutes
-        factors["session_duration"] = 1.0 / (1.0 + math.exp(-(session_minutes - 90) / 20))
-    else:
-        factors["session_duration"] = 0.0
+        pos = session_minutes / _SIGMOID_STEP
+        if pos >= _SIGMOID_LUT.size - 1:
+            factor_vec[_SESSION_IDX] = 0.5 * (math.tanh((session_minutes - 90.0) / 40.0) + 1.0)
+        else:
+            i = int(pos)
+            lo = _SIGMOID_LUT[i]
+            factor_vec[_SESSION_IDX] = lo + (pos - i) * (_SIGMOID_LUT[i + 1] - lo)
 
-    # Factor 5: Break overdue
-    needs_break, mins_since = should_suggest_break(None, metrics.last_break, threshold_minutes=45)
-    if needs_break:
-        factors["break_overdue"] = min(1.0, (mins_since - 45) / 45)
-    else:
-        factors["break_overdue"] = 0.0
-
-    # Factor 6: Topic drift (proxy for executive function decline)
-    # Short, unfocused messages or rapid changes suggest wandering attention
-    if len(metrics.message_lengths) >= 4:
-        recent_lens = metrics.message_lengths[-4:]
-        variance = sum((l - sum(recent_lens)/len(recent_lens))**2 for l in recent_lens) / len(recent_lens)
-        # High variance in message lengths suggests erratic engagement
-        factors["topic_drift"] = min(1.0, variance / 5000)
+    np.clip(factor_vec, 0.0, 1.0, out=factor_vec)
+    return factor_vec, msg_ema_recent
+
+
+def _compute_crash_score(
+    metrics: InteractionMetrics, session_minutes: float, mins_since_break: int
+) -> CrashScore:
+    """
+    Multi-factor weighted crash likelihood scoring.
+    Returns a CrashScore with the overall score; its per-factor breakdown
+    is available lazily as ``factors``.
+    """
+    # Cold start (no samples, no break, no session time): every factor is zero
+    if (not metrics.message_lengths
+            and not metrics.response_times
+            and metrics.current_typing_speed <= 0
+            and not metrics.last_break
+            and session_minutes <= 0):
+        return CrashScore(0.0, np.zeros(len(_FACTOR_KEYS)), (0.0, 0.0))
+
+    # One float64 buffer per series, built once per call; every window below
+    # is a zero-copy slice of it
+    msg_lens = np.fromiter(metrics.message_lengths, dtype=np.float64, count=len(metrics.message_lengths))
+    resp_times = np.fromiter(metrics.response_times, dtype=np.float64, count=len(metrics.response_times))
+    # Overall mean from the running total kept by run_agent; full pass only on cold start
+    if metrics.message_length_total and msg_lens.size:
+        msg_mean = metrics.message_length_total / msg_lens.size
     else:
-        factors["topic_drift"] = 0.0
+        msg_mean = float(msg_lens.mean()) if msg_lens.size else 0.0
+
+    factor_vec, msg_ema_recent = _compute_crash_score_kernel(
+        float(metrics.current_typing_speed),
+        float(metrics.typing_speed_baseline),
+        msg_lens,
+        msg_mean,
+        resp_times,
+        _ema_weights(min(max(msg_lens.size, 3), 5)),
+        _ema_weights(3),
+        float(session_minutes),
+        mins_since_break,
+        mins_since_break >= 45,
+    )
 
     # Weighted sum
-    overall = sum(WEIGHTS[k] * factors[k] for k in WEIGHTS)
+    overall = float(_WEIGHTS_VEC @ factor_vec)
+    return CrashScore(round(min(overall, 1.0), 3), factor_vec, (float(msg_ema_recent), msg_mean))
 
-    return {"overall": round(min(overall, 1.0), 3), "factors": factors}
 
+# Right-aligned EMA weights for message windows of 3, 4 and 5 samples
+_MSG_WINDOW = 5
+_RESP_WINDOW = 8
+_BATCH_MSG_WEIGHTS = np.stack([
+    np.pad(_ema_weights(k), (_MSG_WINDOW - k, 0)) for k in (3, 4, 5)
+])
 
-def _determine_focus(metrics: InteractionMetrics, crash_score: dict) -> str:
+
+def _compute_crash_scores_batch(
+    metrics_list: list[InteractionMetrics],
+    session_minutes: np.ndarray,
+    mins_since_break: np.ndarray,
+) -> list[CrashScore]:
+    """
+    Vectorised _compute_crash_score over N sessions.
+    Each session's trailing samples are right-aligned into fixed-width
+    (N, window) matrices so every factor is one masked NumPy expression.
+    """
+    n = len(metrics_list)
+    if n == 0:
+        return []
+
+    msg_counts = np.empty(n, dtype=np.int64)
+    resp_counts = np.empty(n, dtype=np.int64)
+    msg_totals = np.empty(n, dtype=np.float64)
+    current = np.empty(n, dtype=np.float64)
+    baseline = np.empty(n, dtype=np.float64)
+    msg_win = np.zeros((n, _MSG_WINDOW))
+    resp_win = np.zeros((n, _RESP_WINDOW))
+    for i, m in enumerate(metrics_list):
+        lens, times = m.message_lengths, m.response_times
+        msg_counts[i] = len(lens)
+        resp_counts[i] = len(times)
+        msg_totals[i] = m.message_length_total or sum(lens)
+        current[i] = m.current_typing_speed
+        baseline[i] = m.typing_speed_baseline
+        if lens:
+            tail = lens[-_MSG_WINDOW:]
+            msg_win[i, _MSG_WINDOW - len(tail):] = tail
+        if times:
+            tail = times[-_RESP_WINDOW:]
+            resp_win[i, _RESP_WINDOW - len(tail):] = tail
+
+    factor_mat = np.zeros((n, len(_FACTOR_KEYS)))
+    rows = np.arange(n)
+
+    # Factor 1: Typing speed decline from baseline
+    ok = (baseline > 0) & (current > 0)
+    factor_mat[ok, 0] = 1.0 - current[ok] / baseline[ok]
+
+    # Factor 2: Message length trend (EMA-based)
+    msg_mean = np.divide(msg_totals, msg_counts, out=np.zeros(n), where=msg_counts > 0)
+    ema_recent = (_BATCH_MSG_WEIGHTS[np.clip(msg_counts, 3, 5) - 3] * msg_win).sum(axis=1)
+    ok = msg_counts >= 3
+    ema_recent = np.where(ok, ema_recent, msg_mean)
+    ok &= msg_mean > 0
+    factor_mat[ok, 1] = (1.0 - ema_recent[ok] / msg_mean[ok]) * 2
+
+    # Factor 3: Response time trend (first vs last three of the trailing window)
+    w3 = _ema_weights(3)
+    early_start = _RESP_WINDOW - np.clip(resp_counts, 3, _RESP_WINDOW)
+    early = resp_win[rows[:, None], early_start[:, None] + np.arange(3)] @ w3
+    recent = resp_win[:, -3:] @ w3
+    ok = (resp_counts >= 3) & (early > 0)
+    factor_mat[ok, 2] = (recent[ok] - early[ok]) / early[ok]
+
+    # Factor 4: Break overdue
+    ok = mins_since_break >= 45
+    factor_mat[ok, _BREAK_IDX] = (mins_since_break[ok] - 45) / 45
+
+    # Factor 5: Topic drift
+    ok = msg_counts >= 4
+    factor_mat[ok, _TOPIC_DRIFT_IDX] = msg_win[ok, -4:].var(axis=1) / 5000
+
+    # Factor 6: Session duration sigmoid (tanh form, evaluated for the whole batch)
+    ok = session_minutes > 0
+    factor_mat[ok, _SESSION_IDX] = 0.5 * (np.tanh((session_minutes[ok] - 90.0) / 40.0) + 1.0)
+
+    np.clip(factor_mat, 0.0, 1.0, out=factor_mat)
+    overall = factor_mat @ _WEIGHTS_VEC
+
+    return [
+        CrashScore(
+            round(min(float(overall[i]), 1.0), 3),
+            factor_mat[i],
+            (float(ema_recent[i]), float(msg_mean[i])),
+        )
+        for i in range(n)
+    ]
+
+
+def _determine_focus(metrics: InteractionMetrics, crash_score: CrashScore) -> str:
     """Determine focus level from metrics and crash analysis."""
-    density = crash_score["factors"].get("topic_drift", 0)
-    msg_trend = detect_trend([float(l) for l in metrics.message_lengths[-8:]])
+    density = crash_score.vec[_TOPIC_DRIFT_IDX]
+    ema_recent, ema_overall = crash_score.msg_emas
+    if ema_recent < 0.9 * ema_overall:
+        msg_trend = "decreasing"
+    elif ema_recent > 1.1 * ema_overall:
+        msg_trend = "increasing"
+    else:
+        msg_trend = "stable"
 
     # Hyperfocus: low topic drift, consistent message lengths, no fatigue
     if (density < 0.1
-            and crash_score["overall"] < 0.3
+            and crash_score.overall < 0.3
             and msg_trend != "decreasing"
             and len(metrics.message_lengths) > 5):
         return "hyperfocus"
 
     # High: moderate engagement, low crash risk
-    if crash_score["overall"] < 0.25 and metrics.avg_message_length > 40:
+    if crash_score.overall < 0.25 and metrics.avg_message_length > 40:
         return "high"
 
     # Low: high crash risk or declining metrics
-    if crash_score["overall"] > 0.5 or msg_trend == "decreasing":
+    if crash_score.overall > 0.5 or msg_trend == "decreasing":
         return "low"
 
     return "medium"
 
 
-def _generate_intervention(focus: str, crash: dict, metrics: InteractionMetrics) -> str:
+# ── Intervention message templates ──
+_CRITICAL_TMPL = (
+    "⚠️ **Cognitive Overload Warning**\n\n"
+    "Multiple fatigue indicators are converging ({evidence}). "
+    "Neuroscience research shows that pushing through this state actually *reduces* "
+    "total output compared to taking a break.\n\n"
+    "**Recommended Reset Protocol:**\n"
+    "1. 🧍 Stand up and stretch for 60 seconds\n"
+    "2. 💧 Drink water (dehydration amplifies ADHD symptoms)\n"
+    "3. 👀 Look at something 20+ feet away for 20 seconds\n"
+    "4. 🌬️ Take 3 deep breaths (activates parasympathetic nervous system)\n"
+    "5. ⏱️ Set a 5-minute timer, then come back refreshed"
+)
+
+_GENTLE_TMPL = (
+    "💡 **Gentle Check-in**\n\n"
+    "Your cognitive metrics are showing early fatigue signs "
+    "(crash likelihood: {pct}%). "
+    "This is the *optimal* time for a micro-break — catching it "
+    "early means you can sustain focus much longer.\n\n"
+    "Quick options:\n"
+    "- 🚶 2-minute walk (resets default mode network)\n"
+    "- 🎵 Listen to one song (dopamine boost)\n"
+    "- ✋ Hand stretches (reduces screen fatigue)"
+)
+
+_HYPERFOCUS_TMPL = (
+    "🟣 **Hyperfocus Detected** — {mins}min deep\n\n"
+    "You're in a powerful flow state. I don't want to break it, "
+    "but your brain needs fuel to sustain this. Quick deal: "
+    "finish your current thought, grab water, and come right back. "
+    "Your flow state will survive a 2-minute pause."
+)
+
+
+def _generate_intervention(focus: str, crash: CrashScore, mins_since_break: int) -> str:
     """Generate contextual, neuroscience-backed intervention messages."""
-    score = crash["overall"]
-    factors = crash["factors"]
+    score = crash.overall
 
     if score >= 0.7:
         # Critical — multiple factors converging
-        high_factors = [k for k, v in factors.items() if v > 0.5]
-        evidence = ", ".join(k.replace("_", " ") for k in high_factors[:2])
-        return (
-            f"⚠️ **Cognitive Overload Warning**\n\n"
-            f"Multiple fatigue indicators are converging ({evidence}). "
-            f"Neuroscience research shows that pushing through this state actually *reduces* "
-            f"total output compared to taking a break.\n\n"
-            f"**Recommended Reset Protocol:**\n"
-            f"1. 🧍 Stand up and stretch for 60 seconds\n"
-            f"2. 💧 Drink water (dehydration amplifies ADHD symptoms)\n"
-            f"3. 👀 Look at something 20+ feet away for 20 seconds\n"
-            f"4. 🌬️ Take 3 deep breaths (activates parasympathetic nervous system)\n"
-            f"5. ⏱️ Set a 5-minute timer, then come back refreshed"
-        )
+        high = np.flatnonzero(crash.vec > 0.5)[:2]
+        evidence = ", ".join(_FACTOR_KEYS[i].replace("_", " ") for i in high)
+        return _CRITICAL_TMPL.format(evidence=evidence)
 
     if score >= 0.45:
-        return (
-            f"💡 **Gentle Check-in**\n\n"
-            f"Your cognitive metrics are showing early fatigue signs "
-            f"(crash likelihood: {int(score * 100)}%). "
-            f"This is the *optimal* time for a micro-break — catching it "
-            f"early means you can sustain focus much longer.\n\n"
-            f"Quick options:\n"
-            f"- 🚶 2-minute walk (resets default mode network)\n"
-            f"- 🎵 Listen to one song (dopamine boost)\n"
-            f"- ✋ Hand stretches (reduces screen fatigue)"
-        )
+        return _GENTLE_TMPL.format(pct=int(score * 100))
 
-    if focus == "hyperfocus":
-        needs_break, mins = should_suggest_break(None, metrics.last_break, 60)
-        if needs_break:
-            return (
-                f"🟣 **Hyperfocus Detected** — {mins}min deep\n\n"
-                f"You're in a powerful flow state. I don't want to break it, "
-                f"but your brain needs fuel to sustain this. Quick deal: "
-                f"finish your current thought, grab water, and come right back. "
-                f"Your flow state will survive a 2-minute pause."
-            )
+    if focus == "hyperfocus" and mins_since_break >= 60:
+        return _HYPERFOCUS_TMPL.format(mins=mins_since_break)
 
     return ""
 
 
-def cognitive_predictor_node(state: dict) -> dict:
-    """LangGraph node: advanced multi-factor cognitive state analysis."""
+def _read_inputs(state: dict) -> tuple[InteractionMetrics, CognitiveState, float, int]:
+    """Pull metrics, previous cognitive state and timing out of a graph state."""
+    # State dicts are produced by our own model_dump() calls, so skip re-validation
     raw_metrics = state.get("interaction_metrics", {})
-    metrics = InteractionMetrics(**raw_metrics) if raw_metrics else InteractionMetrics()
+    metrics = InteractionMetrics.model_construct(**raw_metrics) if raw_metrics else InteractionMetrics()
 
     raw_cognitive = state.get("cognitive_state", {})
-    prev = CognitiveState(**raw_cognitive) if raw_cognitive else CognitiveState()
+    prev = CognitiveState.model_construct(**raw_cognitive) if raw_cognitive else CognitiveState()
 
     # Calculate session duration
     session_start = state.get("session_start")
     session_minutes = 0
     if session_start:
         try:
-            session_minutes = (datetime.now() - datetime.fromisoformat(session_start)).total_seconds() / 60
+            session_minutes = (time.time() - iso_timestamp(session_start)) / 60.0
         except (ValueError, TypeError):
             pass
 
-    # Multi-factor crash scoring
-    crash_score = _compute_crash_score(metrics, session_minutes)
+    # Minutes since the last break (0 if none), shared by scoring and intervention
+    _, mins_since_break = should_suggest_break(None, metrics.last_break, threshold_minutes=0)
+
+    return metrics, prev, session_minutes, mins_since_break
+
+
+def _build_update(
+    metrics: InteractionMetrics,
+    prev: CognitiveState,
+    crash_score: CrashScore,
+    mins_since_break: int,
+) -> dict:
+    """Turn a crash score into the node's state update."""
     focus = _determine_focus(metrics, crash_score)
-    intervention = _generate_intervention(focus, crash_score, metrics)
+    intervention = _generate_intervention(focus, crash_score, mins_since_break)
 
     # Dopamine model: decays naturally, boosted by task completion and milestones
     dopamine = max(0, min(100, prev.dopamine_balance - 1))
 
     # Energy model: influenced by crash score
-    if crash_score["overall"] > 0.6:
+    if crash_score.overall > 0.6:
         energy = max(1, prev.energy_level - 2)
-    elif crash_score["overall"] > 0.3:
+    elif crash_score.overall > 0.3:
         energy = max(2, prev.energy_level - 1)
     else:
         energy = min(10, prev.energy_level)  # stable or slight recovery
 
-    crash_minutes = max(5, int(60 * (1 - crash_score["overall"])))
-
-    new_cognitive = CognitiveState(
-        focus_level=focus,
-        energy_level=energy,
-        dopamine_balance=dopamine,
-        crash_prediction=CrashPrediction(
-            likelihood=round(crash_score["overall"], 2),
-            estimated_minutes=crash_minutes,
-        ),
-    )
+    crash_minutes = max(5, int(60 * (1 - crash_score.overall)))
+
+    # Same shape as CognitiveState.model_dump(), built directly
+    new_cognitive = {
+        "focus_level": focus,
+        "energy_level": energy,
+        "dopamine_balance": dopamine,
+        "crash_prediction": {
+            "likelihood": round(crash_score.overall, 2),
+            "estimated_minutes": crash_minutes,
+        },
+    }
 
     return {
-        "cognitive_state": new_cognitive.model_dump(),
+        "cognitive_state": new_cognitive,
         "cognitive_output": intervention,
     }
+
+
+def cognitive_predictor_node(state: dict) -> dict:
+    """LangGraph node: advanced multi-factor cognitive state analysis."""
+    metrics, prev, session_minutes, mins_since_break = _read_inputs(state)
+
+    # Multi-factor crash scoring
+    crash_score = _compute_crash_score(metrics, session_minutes, mins_since_break)
+    return _build_update(metrics, prev, crash_score, mins_since_break)
+
+
+def cognitive_predictor_batch(states: list[dict]) -> list[dict]:
+    """
+    Score many sessions in one vectorised pass.
+    Returns one update per state, identical in shape to cognitive_predictor_node().
+    """
+    inputs = [_read_inputs(s) for s in states]
+    crash_scores = _compute_crash_scores_batch(
+        [i[0] for i in inputs],
+        np.array([i[2] for i in inputs], dtype=np.float64),
+        np.array([i[3] for i in inputs], dtype=np.float64),
+    )
+    return [
+        _build_update(metrics, prev, crash_score, mins_since_break)
+        for (metrics, prev, _, mins_since_break), crash_score in zip(inputs, crash_scores)
+    ]
@@ -8,16 +8,29 @@ activity-based breaks.
 
 from __future__ import annotations
 
-import json
+import bisect
+import io
+import logging
 import random
+import time
 import uuid
 from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional, Sequence, Union
 
-from langchain_google_genai import ChatGoogleGenerativeAI
 from langchain_core.messages import HumanMessage, SystemMessage
+from pydantic import BaseModel, ConfigDict, Field, ValidationError
 
-from vector_store import query_similar_tasks, add_task_embedding
+from vector_store import (
+    add_task_embedding, cache_context_package, embed_once,
+    prefetch_similar_interventions, search_task_context,
+)
 from state import TaskInfo, TaskEnvironment
+from utils.llm import get_llm, unfence
+from utils.metrics import user_estimate_minutes
+from utils.streaming import SectionScanner, stream_writer
+
+logger = logging.getLogger(__name__)
 
 # ---------------------------------------------------------------------------
 # Anti-Repetition Modes (for boring/repetitive tasks)
@@ -56,30 +69,30 @@ ANTI_REPETITION_MODES = [
 # ---------------------------------------------------------------------------
 
 BREAK_ACTIVITIES = {
-    "coding": [
+    "coding": (
         "💃 Dance to ONE K-pop song (literally move your body)",
         "🏃 10 jumping jacks or walk to another room",
         "💧 Drink full glass of water while looking outside",
         "🎵 Switch to next playlist song (dopamine from change)",
-    ],
-    "writing": [
+    ),
+    "writing": (
         "📖 Read exactly 1 page of any book (verbal mode shift)",
         "✍️ Doodle for 3 minutes (visual creativity)",
         "🗣️ Voice memo your current thoughts (brain dump)",
         "🚶 Walk outside for 5 minutes (nature reset)",
-    ],
-    "revision": [
+    ),
+    "revision": (
         "📱 Watch ONE TikTok/YouTube Short (timed reward)",
         "🍿 Snack break (physical reward for boring work)",
         "💬 Text one friend one message (social dopamine)",
         "🎮 2 minutes of mobile game (controlled distraction)",
-    ],
-    "general": [
+    ),
+    "general": (
         "💧 Get a glass of water (movement + hydration)",
         "🚶 Walk around for 3 minutes",
         "🧘 30-second stretch",
         "🎵 Listen to one favourite song",
-    ],
+    ),
 }
 
 # ---------------------------------------------------------------------------
@@ -87,7 +100,7 @@ BREAK_ACTIVITIES = {
 # ---------------------------------------------------------------------------
 
 INITIATION_RITUALS = {
-    "coding": [
+    "coding": (
         "1. Put on headphones (even before music)",
         "2. Open Spotify → 'K-pop Coding' playlist",
         "3. Close ALL browser tabs (physical reset)",
@@ -97,8 +110,8 @@ INITIATION_RITUALS = {
         "7. Write one comment: '# Starting: [exact feature name]'",
         "8. Set timer: 25 minutes",
         "9. Type ANYTHING (even wrong code) within 60 seconds",
-    ],
-    "writing": [
+    ),
+    "writing": (
         "1. Change location (even just different chair)",
         "2. Lo-fi playlist on",
         "3. Coffee shop ambient sounds (layered audio)",
@@ -107,23 +120,139 @@ INITIATION_RITUALS = {
         "6. Set timer: 15 minutes (shorter for high resistance)",
         "7. Write ONE terrible sentence on purpose",
         "8. Don't edit anything for 15 minutes (bypass perfectionism)",
-    ],
-    "revision": [
+    ),
+    "revision": (
         "1. Shuffle materials randomly (break sequence monotony)",
         "2. Get snacks ready (reward for boring work)",
         "3. Set phone timer to 15 minutes (short = achievable)",
         "4. Open notes to a RANDOM page (removes 'where to start')",
         "5. Read the first item out loud (engage verbal brain)",
-    ],
-    "general": [
+    ),
+    "general": (
         "1. Close unnecessary tabs/apps",
         "2. Get water on desk",
         "3. Phone on silent",
         "4. Set a 25-minute timer",
         "5. Start with the SMALLEST specific action",
-    ],
+    ),
+}
+
+# Markdown blocks for the built-in lists, rendered once at import
+_BREAKS_MD = {
+    k: "\n".join(f"- {b}" for b in v) for k, v in BREAK_ACTIVITIES.items()
+}
+_RITUALS_MD = {
+    k: "\n".join(step if step[:1].isdigit() else f"{i}. {step}" for i, step in enumerate(v, 1))
+    for k, v in INITIATION_RITUALS.items()
 }
 
+# Time-of-day buckets: (bucket, prompt context) starting at each hour boundary
+_TIME_OF_DAY_STARTS = (6, 10, 14, 17, 21)
+_LATE_NIGHT = ("night", "Late night (reduced inhibition — can help creativity, hurts focus tasks)")
+_TIME_OF_DAY = (
+    _LATE_NIGHT,
+    ("morning", "Morning (typically rising energy for most people)"),
+    ("midday", "Late morning/early afternoon (peak cognitive window for many)"),
+    ("afternoon", "Afternoon (common post-lunch dip — ADHD brains especially vulnerable)"),
+    ("evening", "Evening (second wind possible, but executive function declining)"),
+    _LATE_NIGHT,
+)
+# Expanded once to one entry per hour of the day
+_HOUR_CONTEXT = tuple(
+    _TIME_OF_DAY[bisect.bisect_right(_TIME_OF_DAY_STARTS, hour)] for hour in range(24)
+)
+
+_MILESTONE_EMOJI = {"checkmark": "☑️", "celebration": "🎉", "snack_break": "🍫", "stretch": "🧘"}
+
+# ---------------------------------------------------------------------------
+# Context Package Schema (mirrors the JSON in _SYSTEM_PROMPT)
+# ---------------------------------------------------------------------------
+
+Number = Union[int, float]
+
+
+class _PackageModel(BaseModel):
+    # LLM output is loose: keep unknown keys, accept numbers where text is expected
+    model_config = ConfigDict(extra="allow", coerce_numbers_to_str=True)
+
+
+class TaskAnalysis(_PackageModel):
+    cognitive_load: str = "medium"
+    task_type: str = "general"
+    creativity_required: str = "balanced"
+    estimated_duration_minutes: Number = 30  # LLMs sometimes answer 22.5; rounded on use
+    interruptibility: str = "flexible"
+    repetition_factor: Number = 0
+    dopamine_difficulty: str = "medium"
+    biggest_blocker: str = "initiation"
+
+
+class MicroStep(_PackageModel):
+    step: str = ""
+    time_estimate_min: Union[Number, str] = "?"
+    dopamine_reward: str = ""
+
+
+class InitiationRitual(_PackageModel):
+    environment_prep: Sequence[str] = Field(default_factory=list)
+    mental_warmup: str = ""
+    first_real_step: str = ""
+
+
+class Milestone(_PackageModel):
+    at_minutes: Union[Number, str] = "?"
+    label: str = ""
+    reward_type: str = ""
+    message: str = ""
+
+
+class FocusTimer(_PackageModel):
+    work_minutes: Number = 25
+    break_minutes: Number = 5
+    total_rounds: Number = 2
+    break_activities: Sequence[str] = Field(default_factory=list)
+
+
+class DopamineCheckpoint(_PackageModel):
+    minute: Union[Number, str] = "?"
+    reward: str = ""
+
+
+class EnvironmentConfig(_PackageModel):
+    music_style: str = "lo-fi"
+    timer_mode: str = "pomodoro"
+    tools_enabled: list[str] = Field(default_factory=lambda: ["notepad"])
+    video_search_term: str = ""
+    layout: str = "focused"
+
+
+class Gamification(_PackageModel):
+    enabled: bool = False
+    game_name: str = "Challenge"
+    objective: str = ""
+    scoring: str = ""
+    victory_condition: str = ""
+
+
+class ThoughtParking(_PackageModel):
+    enabled: bool = True
+    categories: list[str] = Field(default_factory=lambda: ["tasks", "ideas", "worries", "random"])
+
+
+class ContextPackage(_PackageModel):
+    task_analysis: TaskAnalysis = Field(default_factory=TaskAnalysis)
+    micro_steps: list[MicroStep] = Field(default_factory=list)
+    initiation_ritual: InitiationRitual = Field(default_factory=InitiationRitual)
+    milestones: list[Milestone] = Field(default_factory=list)
+    focus_timer: FocusTimer = Field(default_factory=FocusTimer)
+    dopamine_checkpoints: list[DopamineCheckpoint] = Field(default_factory=list)
+    environment_config: EnvironmentConfig = Field(default_factory=EnvironmentConfig)
+    gamification: Gamification = Field(default_factory=Gamification)
+    anti_boredom_strategies: list[str] = Field(default_factory=list)
+    thought_parking: Optional[ThoughtParking] = None
+    rescue_plan: str = ""
+
+
 # ---------------------------------------------------------------------------
 # System Prompt
 # ---------------------------------------------------------------------------
@@ -153,7 +282,7 @@ Respond with EXACTLY this JSON (no markdown fences, no extra text):
     "cognitive_load": "low | medium | high",
     "task_type": "coding | writing | revision | general",
     "creativity_required": "analytical | balanced | creative",
-    "estimated_duration_minutes": <int>,
+    "estimated_duration_minutes": <number>,
     "interruptibility": "deep_focus | flexible | async",
     "repetition_factor": <0-10>,
     "dopamine_difficulty": "low | medium | high",
@@ -231,107 +360,98 @@ Initiation Ritual:
   - Set timer: 25 minutes, type first line within 60 seconds"""
 
 
+_SYSTEM_MESSAGE = SystemMessage(content=_SYSTEM_PROMPT)
+
+# Background vector-store writes; the node doesn't wait on them
+_WRITE_POOL = ThreadPoolExecutor(max_workers=2, thread_name_prefix="taskembed")
+
+
 def context_architect_node(state: dict) -> dict:
     """LangGraph node: generates advanced context packages."""
     user_input = state.get("user_input", "")
-    cognitive = state.get("cognitive_state", {})
-    energy = cognitive.get("energy_level", 5) if cognitive else 5
-    focus = cognitive.get("focus_level", "medium") if cognitive else "medium"
-
-    # Get similar past tasks for calibration
-    similar_tasks = query_similar_tasks(user_input, n_results=3)
-    similar_ctx = ""
-    if similar_tasks:
-        similar_ctx = "\n\nHistorical similar tasks:\n" + "\n".join(
-            f"- {t['description']} (took {t['metadata'].get('actual_duration', '?')} min, "
-            f"load: {t['metadata'].get('cognitive_load', '?')})"
-            for t in similar_tasks
-        )
+    cognitive = state.get("cognitive_state") or {}
+    energy = cognitive.get("energy_level", 5)
+    focus = cognitive.get("focus_level", "medium")
 
     # Detect time of day for energy-curve awareness
-    hour = datetime.now().hour
-    if 6 <= hour < 10:
-        time_context = "Morning (typically rising energy for most people)"
-    elif 10 <= hour < 14:
-        time_context = "Late morning/early afternoon (peak cognitive window for many)"
-    elif 14 <= hour < 17:
-        time_context = "Afternoon (common post-lunch dip — ADHD brains especially vulnerable)"
-    elif 17 <= hour < 21:
-        time_context = "Evening (second wind possible, but executive function declining)"
-    else:
-        time_context = "Late night (reduced inhibition — can help creativity, hurts focus tasks)"
-
-    prompt = (
-        f"## Task Request\n{user_input}\n\n"
-        f"## User's Current State\n"
-        f"- Energy level: {energy}/10\n"
-        f"- Current focus: {focus}\n"
-        f"- Time of day: {time_context}\n"
-        f"{similar_ctx}\n\n"
-        f"Design a comprehensive context package for this task. Be extremely specific — "
-        f"no vague instructions. Every step should be concrete and immediately actionable. "
-        f"Include thought_parking config and specific break activities for the task type."
+    time_bucket, time_context = _HOUR_CONTEXT[time.localtime().tm_hour]
+
+    # Coarse state buckets a cached package must match to be reused
+    energy_bucket = "low" if energy <= 3 else "high" if energy >= 8 else "medium"
+    # The user's stated duration ("write report, 2 hours") must match too
+    stated = user_estimate_minutes(user_input)
+    duration_bucket = (
+        "unstated" if stated is None
+        else "short" if stated <= 30 else "medium" if stated <= 90 else "long"
     )
+    cache_buckets = {
+        "energy_bucket": energy_bucket, "time_bucket": time_bucket,
+        "duration_bucket": duration_bucket,
+    }
 
-    try:
-        llm = ChatGoogleGenerativeAI(model="gemini-flash-lite-latest", temperature=0.7)
-        response = llm.invoke([
-            SystemMessage(content=_SYSTEM_PROMPT),
-            HumanMessage(content=prompt),
-        ])
-        raw = response.content.strip()
-        if raw.startswith("```"):
-            raw = raw.split("\n", 1)[1] if "\n" in raw else raw[3:]
-        if raw.endswith("```"):
-            raw = raw[:-3]
-        raw = raw.strip()
-        context_package = json.loads(raw)
-    except Exception as e:
-        context_package = _fallback_package(user_input, e)
+    embedding = None
+    pkg = None
+    similar_tasks = []
+    seed = state.get("context_package_seed")
+    if seed:
+        # Resubmitted plan: reuse the package this session already generated
+        pkg = ContextPackage.model_validate_json(seed)
+    else:
+        # Embed once; the cache lookup and similar-task search share the vector
+        try:
+            embedding = embed_once(user_input)
+            cached, similar_tasks = search_task_context(embedding, cache_buckets, n_tasks=3)
+            if cached is not None:
+                pkg = ContextPackage.model_validate_json(cached)
+                seed = cached
+        except Exception:
+            logger.debug("Context cache lookup failed; generating a fresh package", exc_info=True)
+
+    if pkg is None:
+        pkg, reusable = _generate_context_package(
+            user_input, energy, focus, time_context, similar_tasks,
+            cache_buckets, embedding,
+        )
+        # Untouched package, before the per-request injections below
+        seed = pkg.model_dump_json() if reusable else None
 
     # Determine task type
-    task_type = context_package.get("task_analysis", {}).get("task_type", "general")
-    repetition = context_package.get("task_analysis", {}).get("repetition_factor", 0)
+    analysis = pkg.task_analysis
+    task_type = analysis.task_type
 
     # Inject anti-repetition mode for boring tasks
     anti_rep_mode = ""
-    if repetition >= 7:
+    if analysis.repetition_factor >= 7:
         mode = random.choice(ANTI_REPETITION_MODES)
         anti_rep_mode = mode["mode"]
         # Inject into anti_boredom_strategies
-        existing = context_package.get("anti_boredom_strategies", [])
-        existing.insert(0, f"🎮 {mode['mode']}: {mode['rules']} — {mode['why']}")
-        context_package["anti_boredom_strategies"] = existing
+        pkg.anti_boredom_strategies.insert(
+            0, f"🎮 {mode['mode']}: {mode['rules']} — {mode['why']}"
+        )
 
     # Inject task-type-specific break activities if not provided
-    breaks_from_llm = context_package.get("focus_timer", {}).get("break_activities", [])
-    if not breaks_from_llm or len(breaks_from_llm) < 2:
-        context_package.setdefault("focus_timer", {})["break_activities"] = (
-            BREAK_ACTIVITIES.get(task_type, BREAK_ACTIVITIES["general"])
-        )
+    defaults_key = task_type if task_type in BREAK_ACTIVITIES else "general"
+    breaks_md = ritual_md = None
+    if len(pkg.focus_timer.break_activities) < 2:
+        pkg.focus_timer.break_activities = BREAK_ACTIVITIES[defaults_key]
+        breaks_md = _BREAKS_MD[defaults_key]
 
     # Inject initiation ritual if sparse
-    ritual = context_package.get("initiation_ritual", {})
-    env_prep = ritual.get("environment_prep", [])
-    if len(env_prep) < 3:
-        context_package["initiation_ritual"]["environment_prep"] = (
-            INITIATION_RITUALS.get(task_type, INITIATION_RITUALS["general"])
-        )
+    if len(pkg.initiation_ritual.environment_prep) < 3:
+        pkg.initiation_ritual.environment_prep = INITIATION_RITUALS[defaults_key]
+        ritual_md = _RITUALS_MD[defaults_key]
 
     # Build task info
     task_id = str(uuid.uuid4())
-    est = context_package.get("task_analysis", {}).get("estimated_duration_minutes", 30)
-    milestones = [m["label"] for m in context_package.get("milestones", [])]
-    dopamine_checkpoints = context_package.get("dopamine_checkpoints", [])
-    initiation_steps = context_package.get("initiation_ritual", {}).get("environment_prep", [])
+    est = round(analysis.estimated_duration_minutes)
 
-    env_config = context_package.get("environment_config", {})
+    env_config = pkg.environment_config
     environment = TaskEnvironment(
-        music_style=env_config.get("music_style", "lo-fi"),
-        timer_mode=env_config.get("timer_mode", "pomodoro"),
-        tools_enabled=env_config.get("tools_enabled", ["notepad"]),
-        video_url=env_config.get("video_search_term", ""),
-        layout=env_config.get("layout", "focused"),
+        music_style=env_config.music_style,
+        timer_mode=env_config.timer_mode,
+        tools_enabled=env_config.tools_enabled,
+        video_url=env_config.video_search_term,
+        layout=env_config.layout,
     )
 
     task_info = TaskInfo(
@@ -341,36 +461,107 @@ def context_architect_node(state: dict) -> dict:
         start_time=datetime.now().isoformat(),
         estimated_duration=est,
         realistic_duration=int(est * 1.5),  # ADHD multiplier
-        context_package=context_package,
+        context_package=pkg.model_dump(),
         environment=environment,
-        progress_milestones=milestones,
+        progress_milestones=[m.label for m in pkg.milestones],
         completed_milestones=[],
         progress_percent=0,
-        dopamine_checkpoints=dopamine_checkpoints,
-        initiation_ritual=initiation_steps,
+        dopamine_checkpoints=[dc.model_dump() for dc in pkg.dopamine_checkpoints],
+        initiation_ritual=list(pkg.initiation_ritual.environment_prep),
         anti_repetition_mode=anti_rep_mode,
     )
 
-    # Store for future similarity
-    add_task_embedding(
+    # Store for future similarity (off the response path)
+    _WRITE_POOL.submit(
+        _store_task_embedding,
         task_id=task_id,
         description=user_input,
         metadata={
-            "cognitive_load": context_package.get("task_analysis", {}).get("cognitive_load", "medium"),
+            "cognitive_load": analysis.cognitive_load,
             "estimated_duration": str(est),
             "task_type": task_type,
         },
+        embedding=embedding,
     )
+    # pattern_interrupt looks these up by task description on every turn
+    prefetch_similar_interventions(user_input)
 
     # Format rich output
-    output_msg = _format_context_package(user_input, context_package)
+    output_msg = _format_context_package(user_input, pkg, ritual_md, breaks_md)
 
     return {
         "current_task": task_info.model_dump(),
         "context_output": output_msg,
+        "context_package_seed": seed,
     }
 
 
+def _store_task_embedding(**kwargs) -> None:
+    try:
+        add_task_embedding(**kwargs)
+    except Exception as e:
+        print(f"[NeuroFlow] Task embedding write failed: {e}")
+
+
+def _generate_context_package(
+    user_input: str,
+    energy,
+    focus: str,
+    time_context: str,
+    similar_tasks: list[dict],
+    cache_buckets: dict,
+    embedding=None,
+) -> tuple[ContextPackage, bool]:
+    """Ask the LLM for a fresh context package and cache it on success.
+
+    The flag is False when the LLM failed and the generic fallback was used.
+    """
+    # Similar past tasks calibrate the estimates
+    similar_ctx = ""
+    if similar_tasks:
+        similar_ctx = "\n\nHistorical similar tasks:\n" + "\n".join(
+            f"- {t['description']} (took {t['metadata'].get('actual_duration', '?')} min, "
+            f"load: {t['metadata'].get('cognitive_load', '?')})"
+            for t in similar_tasks
+        )
+
+    prompt = (
+        f"## Task Request\n{user_input}\n\n"
+        f"## User's Current State\n"
+        f"- Energy level: {energy}/10\n"
+        f"- Current focus: {focus}\n"
+        f"- Time of day: {time_context}\n"
+        f"{similar_ctx}\n\n"
+        f"Design a comprehensive context package for this task. Be extremely specific — "
+        f"no vague instructions. Every step should be concrete and immediately actionable. "
+        f"Include thought_parking config and specific break activities for the task type."
+    )
+
+    emit = stream_writer()
+    scanner = SectionScanner()
+    try:
+        raw = ""
+        for chunk in get_llm(0.7).stream([_SYSTEM_MESSAGE, HumanMessage(content=prompt)]):
+            raw += chunk.content
+            partial = scanner.feed(chunk.content)
+            if partial is not None and emit is not None:
+                try:
+                    partial_pkg = ContextPackage.model_validate(partial)
+                except ValidationError:
+                    continue
+                emit({"context_output": _format_context_package(user_input, partial_pkg)})
+        pkg = ContextPackage.model_validate_json(unfence(raw))
+    except Exception as e:
+        return ContextPackage.model_validate(_fallback_package(user_input, e)), False
+
+    # Cache the untouched LLM output; per-request injections happen afterwards
+    try:
+        cache_context_package(user_input, cache_buckets, pkg.model_dump_json(), embedding)
+    except Exception:
+        pass
+    return pkg, True
+
+
 def _fallback_package(user_input: str, error: Exception) -> dict:
     return {
         "task_analysis": {
@@ -411,105 +602,120 @@ def _fallback_package(user_input: str, error: Exception) -> dict:
     }
 
 
-def _format_context_package(task_desc: str, pkg: dict) -> str:
-    """Format context package into rich markdown."""
-    analysis = pkg.get("task_analysis", {})
-    ritual = pkg.get("initiation_ritual", {})
-    steps = pkg.get("micro_steps", [])
-    milestones = pkg.get("milestones", [])
-    timer = pkg.get("focus_timer", {})
-    game = pkg.get("gamification", {})
-    anti_boredom = pkg.get("anti_boredom_strategies", [])
-    rescue = pkg.get("rescue_plan", "")
-    dopamine_checks = pkg.get("dopamine_checkpoints", [])
-    thought_park = pkg.get("thought_parking", {})
-
-    env_config = pkg.get("environment_config", {})
-    music = env_config.get("music_style", "lo-fi").replace("_", " ").title()
-    timer_mode = env_config.get("timer_mode", "pomodoro").title()
-    tools = ", ".join(t.title() for t in env_config.get("tools_enabled", []))
-    task_type = analysis.get("task_type", "general")
-    est = analysis.get("estimated_duration_minutes", 30)
+def _format_context_package(
+    task_desc: str,
+    pkg: ContextPackage,
+    ritual_md: Optional[str] = None,
+    breaks_md: Optional[str] = None,
+) -> str:
+    """Format context package into rich markdown.
+
+    ritual_md / breaks_md are pre-rendered blocks for the built-in lists,
+    passed when those lists were injected instead of coming from the LLM.
+    """
+    analysis = pkg.task_analysis
+    ritual = pkg.initiation_ritual
+    timer = pkg.focus_timer
+    game = pkg.gamification
+    thought_park = pkg.thought_parking
+
+    env_config = pkg.environment_config
+    music = env_config.music_style.replace("_", " ").title()
+    timer_mode = env_config.timer_mode.title()
+    tools = ", ".join(t.title() for t in env_config.tools_enabled)
+    task_type = analysis.task_type
+    est = round(analysis.estimated_duration_minutes)
     realistic = int(est * 1.5)
 
-    lines = [
-        f"## 🎯 Mission: {task_desc}",
-        "",
-        f"**Cognitive Load:** {analysis.get('cognitive_load', '?')} | "
+    buf = io.StringIO()
+    write = buf.write
+    write(
+        f"## 🎯 Mission: {task_desc}\n"
+        "\n"
+        f"**Cognitive Load:** {analysis.cognitive_load} | "
         f"**Type:** {task_type.title()} | "
-        f"**Est. Time:** {est} min → **Realistic:** {realistic} min (1.5x ADHD buffer)",
-        f"**Environment:** 🎵 {music} | ⏱️ {timer_mode} | 🛠️ {tools}",
-        "",
-        "---",
-        "",
-        "### 🏁 Initiation Ritual (do these NOW)",
-    ]
+        f"**Est. Time:** {est} min → **Realistic:** {realistic} min (1.5x ADHD buffer)\n"
+        f"**Environment:** 🎵 {music} | ⏱️ {timer_mode} | 🛠️ {tools}\n"
+        "\n"
+        "---\n"
+        "\n"
+        "### 🏁 Initiation Ritual (do these NOW)\n"
+    )
 
     # Environment prep
-    env_prep = ritual.get("environment_prep", [])
-    for i, step in enumerate(env_prep, 1):
-        # If step already has a number prefix, use as-is
-        if step[0].isdigit():
-            lines.append(step)
-        else:
-            lines.append(f"{i}. {step}")
+    if ritual_md is not None:
+        write(f"{ritual_md}\n")
+    else:
+        for i, step in enumerate(ritual.environment_prep, 1):
+            # If step already has a number prefix, use as-is
+            if step[:1].isdigit():
+                write(f"{step}\n")
+            else:
+                write(f"{i}. {step}\n")
 
-    warmup = ritual.get("mental_warmup", "")
-    if warmup:
-        lines.append(f"\n**🧠 Mental Warmup:** {warmup}")
+    if ritual.mental_warmup:
+        write(f"\n**🧠 Mental Warmup:** {ritual.mental_warmup}\n")
 
-    first = ritual.get("first_real_step", "")
-    if first:
-        lines.append(f"\n**🚀 FIRST STEP:** {first}")
+    if ritual.first_real_step:
+        write(f"\n**🚀 FIRST STEP:** {ritual.first_real_step}\n")
 
     # Micro-steps
-    lines.append("\n---\n\n### 📝 Micro-Steps")
-    for i, s in enumerate(steps, 1):
-        lines.append(f"{i}. {s['step']} (~{s.get('time_estimate_min', '?')} min) → {s.get('dopamine_reward', '')}")
+    write("\n---\n\n### 📝 Micro-Steps\n")
+    for i, s in enumerate(pkg.micro_steps, 1):
+        write(f"{i}. {s.step} (~{s.time_estimate_min} min) → {s.dopamine_reward}\n")
 
     # Milestones
-    if milestones:
-        lines.append("\n---\n\n### ✅ Milestones")
-        for m in milestones:
-            emoji = {"checkmark": "☑️", "celebration": "🎉", "snack_break": "🍫", "stretch": "🧘"}.get(m.get("reward_type", ""), "⭐")
-            lines.append(f"- ⏱️ {m['at_minutes']} min — **{m['label']}** {emoji} {m.get('message', '')}")
+    if pkg.milestones:
+        write("\n---\n\n### ✅ Milestones\n")
+        for m in pkg.milestones:
+            emoji = _MILESTONE_EMOJI.get(m.reward_type, "⭐")
+            write(f"- ⏱️ {m.at_minutes} min — **{m.label}** {emoji} {m.message}\n")
 
     # Dopamine Checkpoints
-    if dopamine_checks:
-        lines.append("\n---\n\n### 🎁 Dopamine Rewards (Variable Schedule)")
-        for dc in dopamine_checks:
-            lines.append(f"- ⏱️ {dc.get('minute', '?')} min — {dc.get('reward', '')}")
+    if pkg.dopamine_checkpoints:
+        write("\n---\n\n### 🎁 Dopamine Rewards (Variable Schedule)\n")
+        for dc in pkg.dopamine_checkpoints:
+            write(f"- ⏱️ {dc.minute} min — {dc.reward}\n")
 
     # Focus timer
-    lines.append(f"\n---\n\n### ⏱️ Focus Timer")
-    lines.append(f"**{timer.get('total_rounds', 2)}** rounds of **{timer.get('work_minutes', 25)}** min work / **{timer.get('break_minutes', 5)}** min break")
-    breaks = timer.get("break_activities", [])
-    if breaks:
-        lines.append("\n💃 **Break Activities** (NOT 'take a break' — specific actions):")
-        for b in breaks:
-            lines.append(f"- {b}")
+    write(
+        "\n---\n\n### ⏱️ Focus Timer\n"
+        f"**{timer.total_rounds}** rounds of **{timer.work_minutes}** min work / **{timer.break_minutes}** min break\n"
+    )
+    if timer.break_activities:
+        write("\n💃 **Break Activities** (NOT 'take a break' — specific actions):\n")
+        if breaks_md is not None:
+            write(f"{breaks_md}\n")
+        else:
+            for b in timer.break_activities:
+                write(f"- {b}\n")
 
     # Gamification
-    if game and game.get("enabled"):
-        lines.append(f"\n---\n\n### 🎮 Game Mode: \"{game.get('game_name', 'Challenge')}\"")
-        lines.append(f"**Objective:** {game.get('objective', '')}")
-        lines.append(f"**Scoring:** {game.get('scoring', '')}")
-        lines.append(f"**Victory:** {game.get('victory_condition', '')}")
+    if game.enabled:
+        write(
+            f"\n---\n\n### 🎮 Game Mode: \"{game.game_name}\"\n"
+            f"**Objective:** {game.objective}\n"
+            f"**Scoring:** {game.scoring}\n"
+            f"**Victory:** {game.victory_condition}\n"
+        )
 
     # Anti-boredom
-    if anti_boredom:
-        lines.append("\n---\n\n### 🔄 Anti-Boredom Strategies")
-        for s in anti_boredom:
-            lines.append(f"- {s}")
+    if pkg.anti_boredom_strategies:
+        write("\n---\n\n### 🔄 Anti-Boredom Strategies\n")
+        for s in pkg.anti_boredom_strategies:
+            write(f"- {s}\n")
 
     # Thought Parking
-    if thought_park and thought_park.get("enabled", True):
-        lines.append("\n---\n\n### 🧠 Thought Parking Active")
-        lines.append("If random ideas pop up, tell me and I'll park them for later.")
-        lines.append("Categories: Tasks | Ideas | Worries | Random")
+    if thought_park and thought_park.enabled:
+        write(
+            "\n---\n\n### 🧠 Thought Parking Active\n"
+            "If random ideas pop up, tell me and I'll park them for later.\n"
+            "Categories: Tasks | Ideas | Worries | Random\n"
+        )
 
     # Rescue plan
-    if rescue:
-        lines.append(f"\n---\n\n### 🆘 If You Get Stuck\n{rescue}")
+    if pkg.rescue_plan:
+        write(f"\n---\n\n### 🆘 If You Get Stuck\n{pkg.rescue_plan}\n")
 
-    return "\n".join(lines)
+    # Every write ends in a newline; drop the last one to match "\n".join
+    return buf.getvalue()[:-1]
@@ -7,11 +7,15 @@ and budget-based recommendations.
 
 from __future__ import annotations
 
+import bisect
 import random
 import traceback
+from collections import deque
 from datetime import datetime
 
-from state import NeuroFlowState, DopamineEconomy, DopamineTransaction
+import numpy as np
+
+from state import NeuroFlowState, DopamineEconomy
 
 
 # ---------------------------------------------------------------------------
@@ -35,55 +39,98 @@ TRANSACTIONS = {
 }
 
 
+_RNG = np.random.default_rng()
+_MAX_TRANSACTIONS = 20
+
+
 def _generate_variable_schedule(total_duration: int = 60) -> list[int]:
     """Generate variable-ratio reward intervals (slot-machine psychology).
     NOT every 25 min — unpredictable = more engaging for ADHD brains."""
-    intervals = []
-    t = 0
     min_gap, max_gap = 5, 30
-    while t < total_duration:
-        remaining = total_duration - t
-        if remaining < min_gap:
-            break  # Not enough time left for another interval
-        upper = min(max_gap, remaining)
-        gap = random.randint(min_gap, upper)
-        t += gap
-        if t <= total_duration:
-            intervals.append(t)
+    if total_duration < min_gap:
+        return []
+
+    # One uniform draw per possible gap. A gap is unclamped while at least
+    # max_gap minutes remain before it, so that prefix is a cumulative sum.
+    u = _RNG.random(total_duration // min_gap + 1)
+    gaps = (u * (max_gap - min_gap + 1)).astype(np.int64) + min_gap
+    ends = np.cumsum(gaps)
+    n_free = int(np.searchsorted(ends - gaps, total_duration - max_gap, side="right"))
+    intervals = ends[:n_free].tolist()
+
+    # The last few gaps are capped by the time left (at most a handful)
+    t = intervals[-1] if intervals else 0
+    for x in u[n_free:].tolist():
+        if total_duration - t < min_gap:
+            break
+        t += min_gap + int(x * (min(max_gap, total_duration - t) - min_gap + 1))
+        intervals.append(t)
     return intervals
 
 
+# Balance buckets, looked up with bisect_right on the (integer) balance
+_FORECAST_BOUNDS = (30, 50, 70)
+_FORECASTS = (
+    "⛈️ Low energy — plan easy wins to rebuild motivation",
+    "🌥️ Moderate energy — mix easy tasks with one moderate challenge",
+    "⛅ Good energy — you can tackle something meaningful",
+    "☀️ High energy — perfect time for that hard task you've been avoiding!",
+)
+
+_RECOMMENDATION_BOUNDS = (30, 50, 71)
+_RECOMMENDATIONS = (
+    (
+        "Do something EASY and rewarding to rebuild motivation fuel",
+        "Try a quick win — organise one folder, reply to one email",
+        "Take a proper break with a specific reward (snack, music, walk)",
+    ),
+    ("You have moderate motivation. Try a 15-min sprint on something manageable.",),
+    ("Steady state. Keep going at your current pace.",),
+    (
+        "High energy! Perfect time for that hard task you've been avoiding",
+        "Your dopamine tank is full — tackle the most challenging item on your list",
+        "Ride this wave! Start the task you've been dreading — you've got the fuel for it",
+    ),
+)
+
+
 def _compute_forecast(balance: int) -> str:
     """Predict energy outlook based on current balance."""
-    if balance < 30:
-        return "⛈️ Low energy — plan easy wins to rebuild motivation"
-    elif balance < 50:
-        return "🌥️ Moderate energy — mix easy tasks with one moderate challenge"
-    elif balance < 70:
-        return "⛅ Good energy — you can tackle something meaningful"
-    else:
-        return "☀️ High energy — perfect time for that hard task you've been avoiding!"
+    return _FORECASTS[bisect.bisect_right(_FORECAST_BOUNDS, balance)]
 
 
 def _get_recommendation(balance: int, task_type: str = "general") -> str:
     """Budget-based recommendation."""
-    if balance < 30:
-        suggestions = [
-            "Do something EASY and rewarding to rebuild motivation fuel",
-            "Try a quick win — organise one folder, reply to one email",
-            "Take a proper break with a specific reward (snack, music, walk)",
-        ]
-        return random.choice(suggestions)
-    elif balance < 50:
-        return "You have moderate motivation. Try a 15-min sprint on something manageable."
-    elif balance > 70:
-        suggestions = [
-            "High energy! Perfect time for that hard task you've been avoiding",
-            "Your dopamine tank is full — tackle the most challenging item on your list",
-            "Ride this wave! Start the task you've been dreading — you've got the fuel for it",
-        ]
-        return random.choice(suggestions)
-    return "Steady state. Keep going at your current pace."
+    choices = _RECOMMENDATIONS[bisect.bisect_right(_RECOMMENDATION_BOUNDS, balance)]
+    return choices[0] if len(choices) == 1 else random.choice(choices)
+
+
+# ---------------------------------------------------------------------------
+# Event rules: (event_type, guard, description, multiplier or None)
+# ---------------------------------------------------------------------------
+
+_EVENT_RULES = (
+    # Task started; bonus multiplier for starting when tired
+    ("task_started",
+     lambda c: c["intent"] == "start_task" and c["task"],
+     lambda c: f"Started: {c['task'].get('description', 'task')[:40]}",
+     lambda c: 1.5 if c["energy"] < 5 else 1.0),
+    # Pattern interrupted (agent detected and intervened)
+    ("pattern_interrupted",
+     lambda c: c["pattern_output"],
+     "Broke a negative loop — that takes real effort!",
+     None),
+    # Small milestone (check_in intent often means progress)
+    ("small_milestone",
+     lambda c: c["intent"] == "check_in",
+     "Checked in — staying engaged is a win",
+     None),
+    # Took break before crash (cognitive predictor warned + user listened)
+    ("took_break_before_crash",
+     lambda c: c["intent"] == "take_break" and c["cognitive_output"],
+     "Smart break — preventing a crash is self-care",
+     None),
+)
 
 
 # ---------------------------------------------------------------------------
@@ -106,55 +153,55 @@ def dopamine_manager_node(state: dict) -> dict:
     energy = cog.get("energy_level", 7) if cog else 7
 
     now = datetime.now().isoformat()
+    # Plain dicts shaped like state.DopamineTransaction (validating and
+    # dumping a model per event only rebuilt the same dict)
     new_transactions = []
 
     # ---- Detect transaction events from current interaction ----
-
-    # Task started
-    if intent == "start_task" and current_task:
-        pts = TRANSACTIONS["task_started"]
-        # Bonus multiplier for starting when tired
-        if energy < 5:
-            pts = int(pts * 1.5)
-        new_transactions.append(DopamineTransaction(
-            event_type="task_started", points=pts, timestamp=now,
-            description=f"Started: {current_task.get('description', 'task')[:40]}"
-        ).model_dump())
-
-    # Pattern interrupted (agent detected and intervened)
-    if pattern_output:
-        pts = TRANSACTIONS["pattern_interrupted"]
-        new_transactions.append(DopamineTransaction(
-            event_type="pattern_interrupted", points=pts, timestamp=now,
-            description="Broke a negative loop — that takes real effort!"
-        ).model_dump())
-
-    # Small milestone (check_in intent often means progress)
-    if intent == "check_in":
-        pts = TRANSACTIONS["small_milestone"]
-        new_transactions.append(DopamineTransaction(
-            event_type="small_milestone", points=pts, timestamp=now,
-            description="Checked in — staying engaged is a win"
-        ).model_dump())
-
-    # Took break before crash (cognitive predictor warned + user listened)
-    if intent == "take_break" and cognitive_output:
-        pts = TRANSACTIONS["took_break_before_crash"]
-        new_transactions.append(DopamineTransaction(
-            event_type="took_break_before_crash", points=pts, timestamp=now,
-            description="Smart break — preventing a crash is self-care"
-        ).model_dump())
+    ctx = {
+        "intent": intent,
+        "task": current_task,
+        "pattern_output": pattern_output,
+        "cognitive_output": cognitive_output,
+        "energy": energy,
+    }
+    for event_type, guard, describe, multiplier in _EVENT_RULES:
+        if not guard(ctx):
+            continue
+        pts = TRANSACTIONS[event_type]
+        if multiplier is not None:
+            mul = multiplier(ctx)
+            if mul != 1.0:
+                pts = int(pts * mul)
+        new_transactions.append({
+            "event_type": event_type, "points": pts, "timestamp": now,
+            "description": describe(ctx) if callable(describe) else describe,
+        })
+
+    # ---- Nothing happened this turn on the same task: reuse last summary ----
+    schedule_key = current_task.get("task_id", "") if current_task else ""
+    if (not new_transactions and economy and economy.get("last_output")
+            and economy.get("reward_schedule_task_id") == schedule_key):
+        return {
+            "dopamine_economy": economy,
+            "dopamine_output": economy["last_output"],
+        }
 
     # ---- Apply transactions ----
     for t in new_transactions:
         balance += t["points"]
     balance = max(0, min(100, balance))  # clamp 0-100
 
-    all_transactions = transactions + new_transactions
+    # Bounded history: appending past maxlen drops the oldest, no copy/slice
+    history = deque(transactions, maxlen=_MAX_TRANSACTIONS)
+    history.extend(new_transactions)
 
-    # ---- Generate reward schedule ----
-    est_dur = current_task.get("estimated_duration", 60) if current_task else 60
-    schedule = _generate_variable_schedule(est_dur)
+    # ---- Reward schedule: drawn once per task, then kept stable ----
+    if economy and "reward_schedule" in economy and economy.get("reward_schedule_task_id") == schedule_key:
+        schedule = economy["reward_schedule"]
+    else:
+        est_dur = current_task.get("estimated_duration", 60) if current_task else 60
+        schedule = _generate_variable_schedule(est_dur)
 
     # ---- Forecast ----
     forecast = _compute_forecast(balance)
@@ -166,22 +213,27 @@ def dopamine_manager_node(state: dict) -> dict:
         f"📊 **Forecast**: {forecast}",
         f"💡 **Recommendation**: {recommendation}",
     ]
+    rewards = []
+    if schedule:
+        rewards.append(f"🎁 **Next rewards at**: {', '.join(str(m) + ' min' for m in schedule[:4])}")
+    # Balance-only summary, reused as-is on turns with no transactions
+    summary = "\n".join(parts + rewards)
+
     if new_transactions:
         parts.append("📝 **Recent**:")
         for t in new_transactions:
             sign = "+" if t["points"] > 0 else ""
             parts.append(f"   {sign}{t['points']} — {t['description']}")
-    if schedule:
-        parts.append(f"🎁 **Next rewards at**: {', '.join(str(m) + ' min' for m in schedule[:4])}")
-
-    dopamine_output = "\n".join(parts)
+    dopamine_output = "\n".join(parts + rewards)
 
     updated_economy = {
         "daily_balance": balance,
-        "transactions": all_transactions[-20:],  # keep last 20
+        "transactions": list(history),  # keep last 20
         "forecast": forecast,
         "next_reward_minutes": schedule[0] if schedule else 0,
         "reward_schedule": schedule,
+        "reward_schedule_task_id": schedule_key,
+        "last_output": summary,
     }
 
     return {
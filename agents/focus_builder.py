@@ -7,11 +7,14 @@ break activities, and thought parking.
 
 from __future__ import annotations
 
-import json
-import traceback
+import bisect
+import logging
+import re
+import threading
+from collections import OrderedDict
 from datetime import datetime
+from types import MappingProxyType
 
-from langchain_google_genai import ChatGoogleGenerativeAI
 from langchain_core.messages import HumanMessage, SystemMessage
 
 from state import (
@@ -19,6 +22,10 @@ from state import (
     TaskEnvironment,
     BodyDoubleConfig,
 )
+from utils.llm import get_llm, parse_json
+from utils.streaming import SectionScanner, stream_writer
+
+logger = logging.getLogger(__name__)
 
 # ---------------------------------------------------------------------------
 # Prompt
@@ -89,14 +96,86 @@ IMPORTANT: When the user specifies a preferred genre (e.g., "K-Pop", "R&B", "EDM
 
 Return ONLY valid JSON. No markdown fences, no explanation outside the JSON."""
 
+_SYSTEM_MESSAGE = SystemMessage(content=_SYSTEM_PROMPT)
+
+# Structured-input field written by the task form, e.g. "Preferred Music Genre: K-Pop, ..."
+_GENRE_RE = re.compile(r"Preferred Music Genre:\s*([^,\n]*)")
 
 # ---------------------------------------------------------------------------
-# Node
+# Environment cache
 # ---------------------------------------------------------------------------
 
-def focus_builder_node(state: dict) -> dict:
-    """Generate a personalised focus environment configuration."""
+# The environment is a function of a few low-cardinality inputs, so a repeat
+# of (task type, energy band, focus, genre, body-double prefs) reuses the
+# last good reply instead of paying another Gemini round trip.
+_ENERGY_BAND_BOUNDS = (4, 7)  # 1-3 low, 4-6 medium, 7-10 high
+_ENV_CACHE_MAX = 512
+_ENV_CACHE: OrderedDict[tuple, str] = OrderedDict()
+_ENV_CACHE_LOCK = threading.Lock()
+
+
+def _cached_env(key: tuple) -> str | None:
+    with _ENV_CACHE_LOCK:
+        raw = _ENV_CACHE.get(key)
+        if raw is not None:
+            _ENV_CACHE.move_to_end(key)
+        return raw
+
+
+def _remember_env(key: tuple, raw: str) -> None:
+    with _ENV_CACHE_LOCK:
+        _ENV_CACHE[key] = raw
+        _ENV_CACHE.move_to_end(key)
+        if len(_ENV_CACHE) > _ENV_CACHE_MAX:
+            _ENV_CACHE.popitem(last=False)
+
+
+def _remap_playlist(playlist: list, current_task: dict) -> None:
+    """Point a reused playlist's mapped_step fields at the current task."""
+    steps = (current_task.get("context_package") or {}).get("micro_steps") or []
+    labels = [s.get("step", "") for s in steps if s.get("step")]
+    if not labels:
+        labels = [current_task.get("description", "")[:60]]
+    for i, track in enumerate(playlist):
+        track["mapped_step"] = labels[min(i, len(labels) - 1)]
+
+
+# ---------------------------------------------------------------------------
+# Fallback defaults (used when the LLM call or its JSON fails)
+# ---------------------------------------------------------------------------
+
+def _task_default(music_style: str, timer_duration: int, break_activities: tuple) -> MappingProxyType:
+    return MappingProxyType({
+        "music_style": music_style,
+        "timer_duration": timer_duration,
+        "break_activities": break_activities,
+        "summary": f"🎵 {music_style.title()} music | ⏱️ {timer_duration}-min Pomodoro | 👤 Alex is ready",
+    })
+
+
+# Sensible defaults based on task type
+_TASK_DEFAULTS = MappingProxyType({
+    "coding": _task_default("kpop", 25, ("💃 Dance to one song", "🏃 10 jumping jacks", "💧 Drink water")),
+    "writing": _task_default("lo-fi", 45, ("📖 Read one page", "✍️ Doodle 3 min", "🚶 Walk outside")),
+    "revision": _task_default("upbeat", 15, ("📱 Watch ONE short video", "🍿 Snack break", "💬 Text a friend")),
+})
+_GENERAL_DEFAULTS = _task_default("lo-fi", 25, ("💧 Drink water", "🚶 Walk around"))
+
+# Fields of the fallback env config that don't depend on the task type
+_FALLBACK_ENV = MappingProxyType({
+    "timer_mode": "pomodoro",
+    "body_double_enabled": True,
+    "body_double_status": "Getting ready to work with you!",
+    "thought_parking_enabled": True,
+})
+
 
+# ---------------------------------------------------------------------------
+# Node
+# ---------------------------------------------------------------------------
+
+def _prepare(state: dict) -> dict:
+    """Collect the node inputs and build the LLM prompt."""
     current_task = state.get("current_task", {})
     task_desc = current_task.get("description", "") if current_task else ""
     task_type = current_task.get("task_type", "general") if current_task else "general"
@@ -108,13 +187,11 @@ def focus_builder_node(state: dict) -> dict:
     # Extract music genre preference from user input if present
     user_input = state.get("user_input", "")
     music_genre = "any"
-    if "Preferred Music Genre:" in user_input:
-        try:
-            genre_part = user_input.split("Preferred Music Genre:")[1].split(",")[0].strip()
-            if genre_part and genre_part.lower() != "any":
-                music_genre = genre_part
-        except Exception:
-            pass
+    m = _GENRE_RE.search(user_input)
+    if m:
+        genre_part = m.group(1).strip()
+        if genre_part and genre_part.lower() != "any":
+            music_genre = genre_part
 
     # Build context prompt
     prompt = (
@@ -131,92 +208,97 @@ def focus_builder_node(state: dict) -> dict:
         f"Generate the optimal focus environment for this task. "
         f"{'Use ' + music_genre + ' songs for the playlist! Find REAL songs in this genre with appropriate BPM for each section.' if music_genre != 'any' else 'Choose the best genre based on task type.'}"
     )
+    cache_key = (
+        task_type,
+        bisect.bisect_right(_ENERGY_BAND_BOUNDS, energy),
+        focus,
+        music_genre,
+        prefs.get("body_double_name", "Alex"),
+        prefs.get("body_double_preferred", True),
+    )
+    return {
+        "prompt": prompt,
+        "cache_key": cache_key,
+        "cached": False,
+        "current_task": current_task,
+        "task_type": task_type,
+        "music_genre": music_genre,
+        "prefs": prefs,
+    }
+
+
+def _format_focus(env_config: dict, music_genre: str, body_name: str) -> str:
+    """Render the human-readable environment summary for the response generator."""
+    music = env_config.get("music_style", "lo-fi")
+    reasoning = env_config.get("music_reasoning", "")
+    timer = env_config.get("timer_duration", 25)
+    timer_mode = env_config.get("timer_mode", "pomodoro")
+    breaks = env_config.get("break_activities", [])
+    playlist = env_config.get("playlist", [])
+    body_enabled = env_config.get("body_double_enabled", True)
+    body_status = env_config.get("body_double_status", "Getting ready to work...")
+    ambient = env_config.get("ambient_layers", [])
+
+    buf = [f"🎵 **Music**: {music.replace('_', ' ').title()}"]
+    write = buf.append
+    if music_genre != "any":
+        write(f" ({music_genre})")
+    if reasoning:
+        write(f"\n   _Why_: {reasoning}")
+    write(f"\n⏱️  **Timer**: {timer}-min {timer_mode.title()}")
+    if ambient:
+        write(f"\n🌊 **Ambient**: {', '.join(a.replace('_', ' ').title() for a in ambient)}")
+    if body_enabled:
+        write(f"\n👤 **Body Double**: {body_name} — \"{body_status}\"")
+
+    # BPM-mapped playlist
+    if playlist:
+        write("\n\n🎶 **Your Focus Playlist** (BPM-mapped to each phase):\n")
+        write("\n".join(
+            f"   • **{t.get('section', '')}**: {t.get('song', '')} ({t.get('bpm', '?')} BPM) — _{t.get('reason', '')}_"
+            for t in playlist
+        ))
+
+    if breaks:
+        write("\n\n💃 **Break Activities**:\n")
+        write("\n".join(f"   • {b}" for b in breaks[:4]))
+
+    return "".join(buf)
+
+
+def _build_environment(ctx: dict, raw: str | None, error: Exception | None) -> dict:
+    """Turn the raw LLM reply (or the call's error) into the node update."""
+    current_task = ctx["current_task"]
+    task_type = ctx["task_type"]
+    music_genre = ctx["music_genre"]
+    prefs = ctx["prefs"]
 
     env_config = {}
     focus_output = ""
 
     try:
-        llm = ChatGoogleGenerativeAI(model="gemini-flash-lite-latest", temperature=0.6)
-        response = llm.invoke([
-            SystemMessage(content=_SYSTEM_PROMPT),
-            HumanMessage(content=prompt),
-        ])
-
-        raw = response.content.strip()
-        # Strip markdown fences if present
-        if raw.startswith("```"):
-            raw = raw.split("\n", 1)[1] if "\n" in raw else raw[3:]
-        if raw.endswith("```"):
-            raw = raw[:-3]
-        raw = raw.strip()
-
-        env_config = json.loads(raw)
-
-        # Build human-readable summary for the response generator
-        music = env_config.get("music_style", "lo-fi")
-        reasoning = env_config.get("music_reasoning", "")
-        timer = env_config.get("timer_duration", 25)
-        timer_mode = env_config.get("timer_mode", "pomodoro")
-        breaks = env_config.get("break_activities", [])
-        playlist = env_config.get("playlist", [])
-        body_name = prefs.get("body_double_name", "Alex")
-        body_enabled = env_config.get("body_double_enabled", True)
-        body_status = env_config.get("body_double_status", "Getting ready to work...")
-        ambient = env_config.get("ambient_layers", [])
-
-        focus_parts = [
-            f"🎵 **Music**: {music.replace('_', ' ').title()}" + (f" ({music_genre})" if music_genre != "any" else ""),
-            f"   _Why_: {reasoning}" if reasoning else "",
-            f"⏱️  **Timer**: {timer}-min {timer_mode.title()}",
-        ]
-        if ambient:
-            focus_parts.append(f"🌊 **Ambient**: {', '.join(a.replace('_', ' ').title() for a in ambient)}")
-        if body_enabled:
-            focus_parts.append(f"👤 **Body Double**: {body_name} — \"{body_status}\"")
-        
-        # BPM-mapped playlist
-        if playlist:
-            focus_parts.append("\n🎶 **Your Focus Playlist** (BPM-mapped to each phase):")
-            for track in playlist:
-                section = track.get("section", "")
-                song = track.get("song", "")
-                bpm = track.get("bpm", "?")
-                reason = track.get("reason", "")
-                focus_parts.append(f"   • **{section}**: {song} ({bpm} BPM) — _{reason}_")
-        
-        if breaks:
-            focus_parts.append("\n💃 **Break Activities**:")
-            for b in breaks[:4]:
-                focus_parts.append(f"   • {b}")
-
-        focus_output = "\n".join(p for p in focus_parts if p)
+        if error is not None:
+            raise error
+        env_config = parse_json(raw)
+        _remember_env(ctx["cache_key"], raw)
+        if ctx["cached"]:
+            _remap_playlist(env_config.get("playlist", []), current_task)
+
+        focus_output = _format_focus(env_config, music_genre, prefs.get("body_double_name", "Alex"))
 
     except Exception as e:
         print(f"[NeuroFlow] Focus builder error: {e}")
-        traceback.print_exc()
-        # Sensible defaults based on task type
-        defaults = {
-            "coding": {"music_style": "kpop", "timer_duration": 25,
-                       "break_activities": ["💃 Dance to one song", "🏃 10 jumping jacks", "💧 Drink water"]},
-            "writing": {"music_style": "lo-fi", "timer_duration": 45,
-                        "break_activities": ["📖 Read one page", "✍️ Doodle 3 min", "🚶 Walk outside"]},
-            "revision": {"music_style": "upbeat", "timer_duration": 15,
-                         "break_activities": ["📱 Watch ONE short video", "🍿 Snack break", "💬 Text a friend"]},
-        }
-        d = defaults.get(task_type, {"music_style": "lo-fi", "timer_duration": 25,
-                                      "break_activities": ["💧 Drink water", "🚶 Walk around"]})
+        logger.debug("Focus builder fell back to defaults", exc_info=True)
+        d = _TASK_DEFAULTS.get(task_type, _GENERAL_DEFAULTS)
         env_config = {
+            **_FALLBACK_ENV,
             "music_style": d["music_style"],
-            "timer_mode": "pomodoro",
             "timer_duration": d["timer_duration"],
-            "body_double_enabled": True,
-            "body_double_status": "Getting ready to work with you!",
-            "break_activities": d["break_activities"],
+            "break_activities": list(d["break_activities"]),
             "ambient_layers": [],
-            "thought_parking_enabled": True,
             "tools_enabled": ["notepad"],
         }
-        focus_output = f"🎵 {d['music_style'].title()} music | ⏱️ {d['timer_duration']}-min Pomodoro | 👤 Alex is ready"
+        focus_output = d["summary"]
 
     # Update the current task's environment
     updated_task = dict(current_task) if current_task else {}
@@ -245,3 +327,63 @@ def focus_builder_node(state: dict) -> dict:
         "current_task": updated_task,
         "focus_output": focus_output,
     }
+
+
+def _llm_messages(prompt: str) -> list:
+    return [_SYSTEM_MESSAGE, HumanMessage(content=prompt)]
+
+
+def _emit_partial(emit, scanner: SectionScanner, text: str, ctx: dict) -> None:
+    """Push a progressive focus_output once another top-level JSON key closes."""
+    partial = scanner.feed(text)
+    if partial is None or emit is None:
+        return
+    try:
+        body_name = ctx["prefs"].get("body_double_name", "Alex")
+        emit({"focus_output": _format_focus(partial, ctx["music_genre"], body_name)})
+    except Exception:
+        pass
+
+
+def _from_cache(ctx: dict) -> dict | None:
+    raw = _cached_env(ctx["cache_key"])
+    if raw is None:
+        return None
+    ctx["cached"] = True
+    return _build_environment(ctx, raw, None)
+
+
+def focus_builder_node(state: dict) -> dict:
+    """Generate a personalised focus environment configuration."""
+    ctx = _prepare(state)
+    cached = _from_cache(ctx)
+    if cached is not None:
+        return cached
+    emit = stream_writer()
+    scanner = SectionScanner()
+    try:
+        raw = ""
+        for chunk in get_llm(0.6, json_mode=True).stream(_llm_messages(ctx["prompt"])):
+            raw += chunk.content
+            _emit_partial(emit, scanner, chunk.content, ctx)
+    except Exception as e:
+        return _build_environment(ctx, None, e)
+    return _build_environment(ctx, raw, None)
+
+
+async def afocus_builder_node(state: dict) -> dict:
+    """Async variant of focus_builder_node, used when the graph runs via ainvoke."""
+    ctx = _prepare(state)
+    cached = _from_cache(ctx)
+    if cached is not None:
+        return cached
+    emit = stream_writer()
+    scanner = SectionScanner()
+    try:
+        raw = ""
+        async for chunk in get_llm(0.6, json_mode=True).astream(_llm_messages(ctx["prompt"])):
+            raw += chunk.content
+            _emit_partial(emit, scanner, chunk.content, ctx)
+    except Exception as e:
+        return _build_environment(ctx, None, e)
+    return _build_environment(ctx, raw, None)
@@ -6,15 +6,16 @@ confidence scoring, and ADHD-specific behavioral loop detection.
 
 from __future__ import annotations
 
-import json
+import hashlib
+import re
 import uuid
 from datetime import datetime
 
-from langchain_google_genai import ChatGoogleGenerativeAI
 from langchain_core.messages import HumanMessage, SystemMessage
 
 from vector_store import add_intervention, query_similar_interventions
 from state import PatternDetection
+from utils.llm import get_llm, parse_json
 
 _SYSTEM_PROMPT = """You are the Pattern Interrupt Specialist for NeuroFlow — a clinically-informed ADHD cognitive support system.
 
@@ -119,26 +120,70 @@ Respond with EXACTLY this JSON (no markdown fences):
 
 Be warm but honest. Never judgmental. Frame everything as 'your brain is doing a normal ADHD thing' not 'you are procrastinating.'"""
 
+_SYSTEM_MESSAGE = SystemMessage(content=_SYSTEM_PROMPT)
 
-def pattern_interrupt_node(state: dict) -> dict:
-    """LangGraph node: advanced pattern detection with escalating interventions."""
+# Prompt history is trimmed to roughly this many tokens (estimated at ~4 chars
+# per token), always keeping everything from the second-latest user turn on
+_HISTORY_TOKEN_BUDGET = 800
+_CHARS_PER_TOKEN = 4
+
+# PatternDetection.current_pattern values
+_VALID_PATTERNS = frozenset(("none", "avoidance", "distraction", "paralysis", "productive", "perfectionism"))
+
+# Avoidance vocabulary for the sentiment heuristic, matched as substrings like
+# the original `w in msg_text.lower()` scan ("hated" and "stuckness" count)
+_AVOID_RE = re.compile(r"can't|don't know|stuck|give up|impossible|hate", re.IGNORECASE)
+
+
+def _history_hash(recent: tuple, escalation_level: int) -> str:
+    """Digest of the last five messages plus the escalation level."""
+    h = hashlib.blake2b(str(escalation_level).encode(), digest_size=8)
+    for _, content in recent[-5:]:
+        h.update(b"\x1f")
+        h.update(content.encode())
+    return h.hexdigest()
+
+
+def _history_window(recent: tuple) -> list[str]:
+    """Render the newest history lines that fit the prompt token budget."""
+    lines = [f"[{role}]: {content[:400]}" for role, content in recent]
+    human_turns = [i for i, (role, _) in enumerate(recent) if role == "human"]
+    keep_from = human_turns[-2] if len(human_turns) >= 2 else 0
+    budget = _HISTORY_TOKEN_BUDGET * _CHARS_PER_TOKEN
+    start = len(lines)
+    while start > 0:
+        cost = len(lines[start - 1]) + 1
+        if cost > budget and start <= keep_from:
+            break
+        budget -= cost
+        start -= 1
+    return lines[start:]
+
+
+def _prepare(state: dict) -> tuple[dict | None, dict]:
+    """Return (early_result, ctx); early_result skips the LLM call."""
     messages = state.get("messages", [])
     current_task = state.get("current_task", {})
     prev_detection = state.get("pattern_detection", {})
 
     # Build comprehensive history
-    recent = messages[-15:] if len(messages) > 15 else messages
-    history_lines = []
-    for msg in recent:
-        role = getattr(msg, "type", "unknown")
-        content = getattr(msg, "content", str(msg))
-        history_lines.append(f"[{role}]: {content[:400]}")
+    # (role, content) pairs, read off the message objects once
+    recent = tuple(
+        (getattr(msg, "type", "unknown"), getattr(msg, "content", str(msg)))
+        for msg in messages[-15:]
+    )
+    history_lines = _history_window(recent)
 
     if not history_lines:
         return {
             "pattern_detection": PatternDetection().model_dump(),
             "pattern_output": "",
-        }
+        }, {}
+
+    # Nothing new since the last detection (e.g. a resumed run): reuse it
+    history_hash = _history_hash(recent, state.get("pattern_escalation_level", 0))
+    if prev_detection and prev_detection.get("history_hash") == history_hash:
+        return {"pattern_detection": prev_detection, "pattern_output": ""}, {}
 
     task_desc = current_task.get("description", "No active task") if current_task else "No active task"
 
@@ -170,24 +215,28 @@ def pattern_interrupt_node(state: dict) -> dict:
         + escalation_ctx
         + past_ctx
     )
+    return None, {
+        "prompt": prompt,
+        "recent": recent,
+        "history_hash": history_hash,
+        "task_desc": task_desc,
+        "prev_detection": prev_detection,
+        "prev_interventions": prev_interventions,
+    }
+
+
+def _detect(ctx: dict, raw: str | None) -> dict:
+    """Turn the raw LLM reply (None if the call failed) into the node update."""
+    recent = ctx["recent"]
+    task_desc = ctx["task_desc"]
+    prev_detection = ctx["prev_detection"]
+    prev_interventions = ctx["prev_interventions"]
 
     pattern = "none"
     intervention_msg = ""
 
     try:
-        llm = ChatGoogleGenerativeAI(model="gemini-flash-lite-latest", temperature=0.3)
-        response = llm.invoke([
-            SystemMessage(content=_SYSTEM_PROMPT),
-            HumanMessage(content=prompt),
-        ])
-        raw = response.content.strip()
-        if raw.startswith("```"):
-            raw = raw.split("\n", 1)[1] if "\n" in raw else raw[3:]
-        if raw.endswith("```"):
-            raw = raw[:-3]
-        raw = raw.strip()
-
-        result = json.loads(raw)
+        result = parse_json(raw)
         analysis = result.get("analysis", {})
         intervention = result.get("intervention", {})
 
@@ -196,12 +245,8 @@ def pattern_interrupt_node(state: dict) -> dict:
         intervention_msg = intervention.get("message", "")
 
         # Map variants
-        valid = {"none", "avoidance", "productive_procrastination", "distraction",
-                 "paralysis", "perfectionism", "productive"}
         if pattern == "productive_procrastination":
             pattern = "productive"
-        if pattern not in valid:
-            pattern = "none"
 
         # Only show intervention if confident enough
         if confidence < 0.35:
@@ -210,6 +255,9 @@ def pattern_interrupt_node(state: dict) -> dict:
     except Exception:
         pass
 
+    if not isinstance(pattern, str) or pattern not in _VALID_PATTERNS:
+        pattern = "none"
+
     # Store for learning
     if pattern != "none" and intervention_msg:
         add_intervention(
@@ -228,25 +276,54 @@ def pattern_interrupt_node(state: dict) -> dict:
     # Track sentiment trajectory (simple heuristic from message lengths + patterns)
     prev_sentiments = prev_detection.get("sentiment_trajectory", []) if prev_detection else []
     # Approximate: shorter messages + avoidance words = declining sentiment
-    latest_msgs = [getattr(m, "content", str(m)) for m in recent[-5:] if getattr(m, "type", "") == "human"]
+    latest_msgs = [content for role, content in recent[-5:] if role == "human"]
     new_sentiments = list(prev_sentiments)
     for msg_text in latest_msgs:
-        # Simple sentiment heuristic (positive = long, engaged; negative = short, avoidant)
-        length_score = min(len(msg_text) / 200.0, 1.0)  # normalize
-        avoidance_words = ["can't", "don't know", "stuck", "give up", "impossible", "hate"]
-        neg_count = sum(1 for w in avoidance_words if w in msg_text.lower())
-        sentiment = length_score - (neg_count * 0.3)
-        new_sentiments.append(round(max(-1.0, min(1.0, sentiment)), 2))
+        # Simple sentiment heuristic (positive = long, engaged; negative = short, avoidant),
+        # scored in hundredths: +1 per 2 chars up to 100, -30 per avoidance hit
+        score = min(100, len(msg_text) // 2) - 30 * len(_AVOID_RE.findall(msg_text))
+        new_sentiments.append((score if score > -100 else -100) / 100)
     new_sentiments = new_sentiments[-10:]  # keep last 10
 
-    detection = PatternDetection(
-        current_pattern=pattern if pattern != "productive_procrastination" else "productive",
-        pattern_start_time=datetime.now().isoformat() if pattern != "none" else None,
-        interventions_attempted=attempted[-5:],
-        sentiment_trajectory=new_sentiments,
-    )
+    # Every field is already normalised above, so build PatternDetection's
+    # dump shape directly instead of validating and dumping a model
+    detection = {
+        "current_pattern": pattern,
+        "pattern_start_time": datetime.now().isoformat() if pattern != "none" else None,
+        "interventions_attempted": attempted[-5:],
+        "sentiment_trajectory": new_sentiments,
+        "history_hash": ctx["history_hash"],
+    }
 
     return {
-        "pattern_detection": detection.model_dump(),
+        "pattern_detection": detection,
         "pattern_output": intervention_msg,
     }
+
+
+def _llm_messages(prompt: str) -> list:
+    return [_SYSTEM_MESSAGE, HumanMessage(content=prompt)]
+
+
+def pattern_interrupt_node(state: dict) -> dict:
+    """LangGraph node: advanced pattern detection with escalating interventions."""
+    early, ctx = _prepare(state)
+    if early is not None:
+        return early
+    try:
+        raw = get_llm(0.3, json_mode=True).invoke(_llm_messages(ctx["prompt"])).content
+    except Exception:
+        raw = None
+    return _detect(ctx, raw)
+
+
+async def apattern_interrupt_node(state: dict) -> dict:
+    """Async variant of pattern_interrupt_node, used when the graph runs via ainvoke."""
+    early, ctx = _prepare(state)
+    if early is not None:
+        return early
+    try:
+        raw = (await get_llm(0.3, json_mode=True).ainvoke(_llm_messages(ctx["prompt"]))).content
+    except Exception:
+        raw = None
+    return _detect(ctx, raw)
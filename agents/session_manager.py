@@ -5,9 +5,17 @@ Advanced intent classification with chain-of-thought reasoning.
 
 from __future__ import annotations
 
-from langchain_google_genai import ChatGoogleGenerativeAI
+import asyncio
+import re
+import weakref
+from functools import lru_cache
+
+import numpy as np
 from langchain_core.messages import HumanMessage, SystemMessage
 
+from vector_store import embed_once
+from utils.llm import get_llm, parse_json
+
 INTENTS = ["start_task", "stuck", "distracted", "check_in", "general_chat", "take_break"]
 
 _SYSTEM_PROMPT = """You are the Session Manager for NeuroFlow, a clinically-informed ADHD cognitive support system built on neuroscience research.
@@ -39,9 +47,97 @@ Respond with EXACTLY this JSON (no markdown fences):
   "adhd_signal": "none | avoidance | paralysis | hyperfocus | time_blindness | impulsivity"
 }"""
 
+_SYSTEM_MESSAGE = SystemMessage(content=_SYSTEM_PROMPT)
 
-def session_manager_node(state: dict) -> dict:
-    """LangGraph node: advanced intent classification with chain-of-thought."""
+# ---------------------------------------------------------------------------
+# Local first-pass classifier
+# ---------------------------------------------------------------------------
+
+# Clear-cut messages are matched against per-intent exemplar centroids using
+# the vector store's MiniLM embedder; only ambiguous ones go to Gemini.
+_INTENT_EXEMPLARS = {
+    "start_task": (
+        "I want to start working on my essay",
+        "Help me plan my coding project",
+        "Let's set up a study session for my exam",
+        "I need to write the report today",
+    ),
+    "stuck": (
+        "I'm stuck and can't figure this out",
+        "This is too overwhelming, I don't know where to begin",
+        "I keep staring at it and nothing happens",
+        "I give up, it's impossible",
+    ),
+    "distracted": (
+        "Sorry, I got distracted scrolling my phone",
+        "I went off track watching videos",
+        "I'm back, I lost focus for a while",
+        "Oops, I started doing something else",
+    ),
+    "check_in": (
+        "How am I doing?",
+        "How long have I been working?",
+        "What's my progress so far?",
+        "Am I on track?",
+    ),
+    "take_break": (
+        "I need a break",
+        "I'm exhausted, can I rest for a bit?",
+        "Let me pause for a few minutes",
+        "I'm tired, time for a break",
+    ),
+    "general_chat": (
+        "What can you do?",
+        "Hi there",
+        "Tell me about ADHD",
+        "Thanks!",
+    ),
+}
+_LOCAL_MIN_SCORE = 0.45
+_LOCAL_MIN_MARGIN = 0.08
+
+# Cheap gate in front of the embedding: only short messages using some intent's
+# cue words are embedded; the rest would likely miss the thresholds above and
+# go straight to the LLM without paying for a MiniLM pass first
+_LOCAL_MAX_CHARS = 160
+_INTENT_CUE_RE = re.compile(
+    r"\b(?:start|begin|plan|work on|need to|write|study|stuck|can'?t|overwhelm\w*|"
+    r"give up|impossible|staring|distract\w*|scroll\w*|phone|videos?|off track|"
+    r"lost focus|back|oops|how am i|how long|progress|on track|break|tired|"
+    r"exhausted|rest|pause|hi|hello|hey|thanks?|thank you|what can you|tell me)\b",
+    re.IGNORECASE,
+)
+
+
+@lru_cache(maxsize=1)
+def _intent_centroids() -> tuple[tuple[str, ...], np.ndarray]:
+    labels = tuple(_INTENT_EXEMPLARS)
+    rows = []
+    for intent in labels:
+        centroid = np.mean([embed_once(t) for t in _INTENT_EXEMPLARS[intent]], axis=0)
+        rows.append(centroid / np.linalg.norm(centroid))
+    return labels, np.stack(rows)
+
+
+def _local_intent(user_input: str) -> str | None:
+    """Return the intent when the local classifier is confident, else None."""
+    if len(user_input) > _LOCAL_MAX_CHARS or not _INTENT_CUE_RE.search(user_input):
+        return None
+    try:
+        labels, centroids = _intent_centroids()
+        emb = embed_once(user_input)
+        scores = centroids @ (emb / np.linalg.norm(emb))
+    except Exception:
+        return None
+    second, best = np.argsort(scores)[-2:]
+    # Written so a NaN score (zero-norm embedding) also falls through to the LLM
+    if scores[best] >= _LOCAL_MIN_SCORE and scores[best] - scores[second] >= _LOCAL_MIN_MARGIN:
+        return labels[best]
+    return None
+
+
+def _prepare(state: dict) -> tuple[dict | None, str]:
+    """Return (early_result, context_msg); early_result skips the LLM call."""
     user_input = state.get("user_input", "")
     interaction_count = state.get("interaction_count", 0)
 
@@ -50,7 +146,15 @@ def session_manager_node(state: dict) -> dict:
             "intent": "general_chat",
             "priority": False,
             "interaction_count": interaction_count + 1,
-        }
+        }, ""
+
+    intent = _local_intent(user_input)
+    if intent is not None:
+        return {
+            "intent": intent,
+            "priority": intent in ("stuck", "distracted"),
+            "interaction_count": interaction_count + 1,
+        }, ""
 
     # Rich context building
     current_task = state.get("current_task", {})
@@ -79,22 +183,13 @@ def session_manager_node(state: dict) -> dict:
         f"\n## Recent Conversation\n{history_str}\n"
         f"\n## Current User Message\n{user_input}"
     )
+    return None, context_msg
+
 
+def _classify(state: dict, raw: str | None) -> dict:
+    """Turn the raw LLM reply (None if the call failed) into the node update."""
     try:
-        llm = ChatGoogleGenerativeAI(model="gemini-flash-lite-latest", temperature=0.1)
-        response = llm.invoke([
-            SystemMessage(content=_SYSTEM_PROMPT),
-            HumanMessage(content=context_msg),
-        ])
-        raw = response.content.strip()
-        if raw.startswith("```"):
-            raw = raw.split("\n", 1)[1] if "\n" in raw else raw[3:]
-        if raw.endswith("```"):
-            raw = raw[:-3]
-        raw = raw.strip()
-
-        import json
-        result = json.loads(raw)
+        result = parse_json(raw)
         intent = result.get("intent", "general_chat")
         urgency = result.get("urgency", "low")
 
@@ -109,5 +204,102 @@ def session_manager_node(state: dict) -> dict:
     return {
         "intent": intent,
         "priority": priority,
-        "interaction_count": interaction_count + 1,
+        "interaction_count": state.get("interaction_count", 0) + 1,
     }
+
+
+def _llm_messages(context_msg: str) -> list:
+    return [_SYSTEM_MESSAGE, HumanMessage(content=context_msg)]
+
+
+class _IntentBatcher:
+    """Coalesces intent classifications that arrive within a short window.
+
+    Each caller awaits its own future; after `window` seconds (or once
+    `max_batch` prompts are queued) the pending prompts go out together via
+    llm.abatch(), which runs them concurrently, and the replies are handed
+    back by position. A lone prompt is sent as a plain ainvoke().
+    """
+
+    def __init__(self, window: float = 0.05, max_batch: int = 16) -> None:
+        self.window = window
+        self.max_batch = max_batch
+        self.pending: list[tuple[str, asyncio.Future]] = []
+        self.timer: asyncio.TimerHandle | None = None
+        # The loop holds tasks weakly; keep in-flight sends alive until done
+        self.sending: set[asyncio.Task] = set()
+
+    async def classify(self, context_msg: str) -> str:
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self.pending.append((context_msg, future))
+        if len(self.pending) >= self.max_batch:
+            self._flush()
+        elif self.timer is None:
+            self.timer = loop.call_later(self.window, self._flush)
+        return await future
+
+    def _flush(self) -> None:
+        if self.timer is not None:
+            self.timer.cancel()
+            self.timer = None
+        batch, self.pending = self.pending, []
+        if batch:
+            task = asyncio.ensure_future(self._send(batch))
+            self.sending.add(task)
+            task.add_done_callback(self.sending.discard)
+
+    async def _send(self, batch: list[tuple[str, asyncio.Future]]) -> None:
+        llm = get_llm(0.1, json_mode=True)
+        try:
+            if len(batch) == 1:
+                replies = [await llm.ainvoke(_llm_messages(batch[0][0]))]
+            else:
+                replies = await llm.abatch(
+                    [_llm_messages(msg) for msg, _ in batch], return_exceptions=True,
+                )
+        except Exception as e:
+            replies = [e] * len(batch)
+        for (_, future), reply in zip(batch, replies):
+            if future.done():
+                continue
+            if isinstance(reply, Exception):
+                future.set_exception(reply)
+            else:
+                future.set_result(reply.content)
+
+
+# One batcher per event loop, since its futures and timer belong to that loop
+_BATCHERS: weakref.WeakKeyDictionary = weakref.WeakKeyDictionary()
+
+
+def _batcher() -> _IntentBatcher:
+    loop = asyncio.get_running_loop()
+    batcher = _BATCHERS.get(loop)
+    if batcher is None:
+        batcher = _BATCHERS[loop] = _IntentBatcher()
+    return batcher
+
+
+def session_manager_node(state: dict) -> dict:
+    """LangGraph node: advanced intent classification with chain-of-thought."""
+    early, context_msg = _prepare(state)
+    if early is not None:
+        return early
+    try:
+        raw = get_llm(0.1, json_mode=True).invoke(_llm_messages(context_msg)).content
+    except Exception:
+        raw = None
+    return _classify(state, raw)
+
+
+async def asession_manager_node(state: dict) -> dict:
+    """Async variant of session_manager_node, used when the graph runs via ainvoke."""
+    early, context_msg = _prepare(state)
+    if early is not None:
+        return early
+    try:
+        raw = await _batcher().classify(context_msg)
+    except Exception:
+        raw = None
+    return _classify(state, raw)
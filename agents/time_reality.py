@@ -6,14 +6,14 @@ historical calibration, and proactive time anchoring.
 
 from __future__ import annotations
 
-import json
 from datetime import datetime
+from functools import lru_cache
+from types import MappingProxyType
 
-from langchain_google_genai import ChatGoogleGenerativeAI
-from langchain_core.messages import HumanMessage, SystemMessage
+import numpy as np
 
-from database import get_task_history
-from vector_store import query_similar_tasks
+from database import get_task_history, task_history_version
+from utils.metrics import minutes_since, user_estimate_minutes
 
 ADHD_MULTIPLIER = 1.5
 
@@ -35,50 +35,107 @@ When providing time estimates or schedules, be:
 Respond naturally and conversationally. Include time-reality observations when relevant."""
 
 
-def _get_elapsed_minutes(task: dict) -> int:
+def _get_elapsed_minutes(task: dict, now_ts: float | None = None) -> int:
     start = task.get("start_time")
     if not start:
         return 0
     try:
-        return int((datetime.now() - datetime.fromisoformat(start)).total_seconds() / 60)
+        return minutes_since(start, now_ts)
     except (ValueError, TypeError):
         return 0
 
 
+_HISTORY_LIMIT = 100
+
+
+@lru_cache(maxsize=512)
+def _keywords(text: str) -> frozenset:
+    """Lower-cased word set of a description, tokenized once per distinct text."""
+    return frozenset(text.lower().split())
+
+
+class _HistoryIndex:
+    """Keyword postings over recent task history for one table version.
+
+    Only tasks with both an estimate and an actual duration are indexed,
+    since those are the only ones the stats can use.
+    """
+
+    def __init__(self, version: int, history: list[dict]) -> None:
+        self.version = version
+        actuals, estimates = [], []
+        # word -> bitmap of positions in the duration arrays (bit i = task i)
+        postings: dict[str, int] = {}
+        for task in history:
+            actual, estimated = task.get("actual_duration"), task.get("estimated_duration")
+            if not (actual and estimated):
+                continue
+            pos = len(actuals)
+            actuals.append(actual)
+            estimates.append(estimated)
+            bit = 1 << pos
+            for word in _keywords(task.get("description", "")):
+                postings[word] = postings.get(word, 0) | bit
+
+        self.actuals = np.asarray(actuals, dtype=np.float64)
+        self.estimates = np.asarray(estimates, dtype=np.float64)
+        self.postings = postings
+
+
+_history_index: _HistoryIndex | None = None
+
+
+def _current_history_index() -> _HistoryIndex:
+    global _history_index
+    version = task_history_version()
+    index = _history_index
+    if index is None or index.version != version:
+        index = _history_index = _HistoryIndex(version, get_task_history(limit=_HISTORY_LIMIT))
+    return index
+
+
+@lru_cache(maxsize=256)
+def _stats_for(keywords: frozenset, version: int) -> tuple:
+    index = _current_history_index()
+    # Bitwise "seen at least once" / "seen at least twice" over the postings
+    seen = twice = 0
+    for word in keywords:
+        bits = index.postings.get(word)
+        if bits:
+            twice |= seen & bits
+            seen |= bits
+    if not twice:
+        return None, 0, None
+
+    n = len(index.actuals)
+    mask = np.unpackbits(
+        np.frombuffer(twice.to_bytes((n + 7) // 8, "little"), dtype=np.uint8),
+        count=n, bitorder="little",
+    ).view(bool)
+    count = twice.bit_count()
+
+    actuals, estimates = index.actuals[mask], index.estimates[mask]
+    positive = estimates > 0
+    avg_accuracy = float((actuals[positive] / estimates[positive]).mean()) if positive.any() else None
+    return (
+        round(float(actuals.mean()), 1),
+        count,
+        round(avg_accuracy, 2) if avg_accuracy else None,
+    )
+
+
 def _get_historical_stats(description: str) -> dict:
-    """Get historical performance data for similar tasks."""
-    history = get_task_history(limit=100)
-    if not history:
-        return {"avg_duration": None, "count": 0, "avg_estimate_accuracy": None}
-
-    keywords = set(description.lower().split())
-    relevant = []
-    for task in history:
-        task_words = set(task.get("description", "").lower().split())
-        overlap = len(keywords & task_words)
-        if overlap >= 2 and task.get("actual_duration") and task.get("estimated_duration"):
-            relevant.append(task)
-
-    if not relevant:
-        return {"avg_duration": None, "count": 0, "avg_estimate_accuracy": None}
-
-    avg_actual = sum(t["actual_duration"] for t in relevant) / len(relevant)
-    accuracies = [
-        t["actual_duration"] / t["estimated_duration"]
-        for t in relevant if t["estimated_duration"] > 0
-    ]
-    avg_accuracy = sum(accuracies) / len(accuracies) if accuracies else None
+    """Get historical performance data for similar tasks.
 
-    return {
-        "avg_duration": round(avg_actual, 1),
-        "count": len(relevant),
-        "avg_estimate_accuracy": round(avg_accuracy, 2) if avg_accuracy else None,
-    }
+    A task is similar when it shares at least two words with the description.
+    Results are cached per keyword set until task_history is next written.
+    """
+    avg_duration, count, accuracy = _stats_for(_keywords(description), task_history_version())
+    return {"avg_duration": avg_duration, "count": count, "avg_estimate_accuracy": accuracy}
 
 
-def _get_energy_context() -> dict:
-    """Get time-of-day energy curve context."""
-    hour = datetime.now().hour
+def _energy_phase(hour: int) -> dict:
+    """Energy curve context for an hour of the day (0-23)."""
     if 6 <= hour < 9:
         return {
             "phase": "Morning Ramp-up",
@@ -117,6 +174,17 @@ def _get_energy_context() -> dict:
         }
 
 
+# One read-only entry per hour, shared by every caller
+_ENERGY_TABLE: tuple[MappingProxyType, ...] = tuple(
+    MappingProxyType(_energy_phase(hour)) for hour in range(24)
+)
+
+
+def _get_energy_context(now: datetime | None = None) -> MappingProxyType:
+    """Get time-of-day energy curve context."""
+    return _ENERGY_TABLE[(now or datetime.now()).hour]
+
+
 def time_reality_node(state: dict) -> dict:
     """LangGraph node: advanced time reality with energy-curve awareness."""
     user_input = state.get("user_input", "")
@@ -124,24 +192,18 @@ def time_reality_node(state: dict) -> dict:
     intent = state.get("intent", "general_chat")
 
     output_parts = []
-    energy_ctx = _get_energy_context()
+    # One clock read per turn so every figure below agrees
+    now = datetime.now()
+    now_ts = now.timestamp()
+    energy_ctx = _get_energy_context(now)
 
     # ── Case 1: Starting a new task ──
     if intent == "start_task":
         # Extract user estimate
-        user_estimate = None
-        for word in user_input.split():
-            try:
-                num = int(word)
-                if 1 <= num <= 480:
-                    user_estimate = num
-                    break
-            except ValueError:
-                continue
+        user_estimate = user_estimate_minutes(user_input)
 
         # Historical data
         stats = _get_historical_stats(user_input)
-        similar = query_similar_tasks(user_input, n_results=3)
 
         output_parts.append("### ⏱️ Time Reality Check\n")
 
@@ -172,7 +234,7 @@ def time_reality_node(state: dict) -> dict:
 
     # ── Case 2: Task in progress ──
     elif current_task and current_task.get("description"):
-        elapsed = _get_elapsed_minutes(current_task)
+        elapsed = _get_elapsed_minutes(current_task, now_ts)
         estimated = current_task.get("estimated_duration", 30)
         remaining = max(0, estimated - elapsed)
 
@@ -203,24 +265,28 @@ def time_reality_node(state: dict) -> dict:
     # ── Case 3: Check-in ──
     if intent == "check_in":
         if current_task and current_task.get("description"):
-            elapsed = _get_elapsed_minutes(current_task)
+            elapsed = _get_elapsed_minutes(current_task, now_ts)
             estimated = current_task.get("estimated_duration", 30)
             progress = current_task.get("progress_percent", 0)
 
-            output_parts.append(
-                f"### 📊 Session Check-in\n\n"
-                f"| Metric | Value |\n|--------|-------|\n"
-                f"| Task | {current_task.get('description', 'N/A')} |\n"
-                f"| Time | {elapsed} min / {estimated} min estimated |\n"
-                f"| Progress | {progress}% |\n"
-                f"| Status | {'🟢 On track' if elapsed <= estimated else '🟡 Over estimate'} |\n"
-                f"| Energy Phase | {energy_ctx['phase']} |\n\n"
-                f"💡 *{energy_ctx['tip']}*"
-            )
+            rows = [
+                "### 📊 Session Check-in",
+                "",
+                "| Metric | Value |",
+                "|--------|-------|",
+                f"| Task | {current_task.get('description', 'N/A')} |",
+                f"| Time | {elapsed} min / {estimated} min estimated |",
+                f"| Progress | {progress}% |",
+                f"| Status | {'🟢 On track' if elapsed <= estimated else '🟡 Over estimate'} |",
+                f"| Energy Phase | {energy_ctx['phase']} |",
+                "",
+                f"💡 *{energy_ctx['tip']}*",
+            ]
+            output_parts.append("\n".join(rows))
         else:
             session_start = state.get("session_start")
             if session_start:
-                session_min = int((datetime.now() - datetime.fromisoformat(session_start)).total_seconds() / 60)
+                session_min = minutes_since(session_start, now_ts)
                 output_parts.append(
                     f"### 📊 Session Summary\n"
                     f"You've been in this session for **{session_min} min**.\n"
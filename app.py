@@ -5,10 +5,13 @@ Focus Environment Builder, and Dopamine Economy Manager.
 """
 
 import os
+import re
 import uuid
 import traceback
 import time
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
+from typing import Iterator
 
 import streamlit as st
 from dotenv import load_dotenv
@@ -33,6 +36,7 @@ from state import (
     TaskEnvironment,
 )
 from database import init_db, log_interaction
+from utils.metrics import minutes_since
 
 init_db()
 
@@ -255,23 +259,49 @@ div[data-testid="stChatInput"] textarea:focus {
 </style>
 """
 
-st.markdown(CUSTOM_CSS, unsafe_allow_html=True)
+
+
+@st.cache_resource
+def _css_markup() -> str:
+    """CUSTOM_CSS minified once per process; it is re-sent on every rerun."""
+    css = re.sub(r"/\*.*?\*/", "", CUSTOM_CSS, flags=re.DOTALL)
+    css = re.sub(r"\s+", " ", css)
+    css = re.sub(r"\s*([{};,>])\s*", r"\1", css)
+    return re.sub(r":\s+", ":", css).strip()
+
+
+st.markdown(_css_markup(), unsafe_allow_html=True)
 
 # ============================================================
 # Session State
 # ============================================================
 
+@st.cache_resource
+def _get_graph():
+    """One compiled graph for every session; each session runs on its own
+    checkpointer thread (thread_id = session_id)."""
+    return build_graph()
+
+
+@st.cache_resource
+def _io_pool() -> ThreadPoolExecutor:
+    """Background pool for bookkeeping writes that run_agent doesn't wait on."""
+    return ThreadPoolExecutor(max_workers=2, thread_name_prefix="neuroflow-io")
+
+
 def _init_session():
     if "session_id" not in st.session_state:
         st.session_state.session_id = str(uuid.uuid4())
-        st.session_state.session_start = datetime.now().isoformat()
+        st.session_state.session_start_ts = time.time()
+        st.session_state.session_start = datetime.fromtimestamp(st.session_state.session_start_ts).isoformat()
         st.session_state.chat_history = []
         st.session_state.cognitive = CognitiveState().model_dump()
-        st.session_state.interaction_metrics = InteractionMetrics().model_dump()
+        # Kept as a live model and mutated in place; dumped only for the graph
+        st.session_state.interaction_metrics = InteractionMetrics()
         st.session_state.pattern_detection = PatternDetection().model_dump()
         st.session_state.current_task = {}
         st.session_state.dopamine_economy = {}
-        st.session_state.graph = build_graph()
+        st.session_state.graph = _get_graph()
         st.session_state.interaction_count = 0
         st.session_state.last_msg_time = datetime.now()
         st.session_state.pattern_history = []
@@ -282,38 +312,77 @@ def _init_session():
 
 _init_session()
 
+
+def _session_metrics() -> InteractionMetrics:
+    metrics = st.session_state.interaction_metrics
+    if isinstance(metrics, dict):
+        # Session created before metrics were kept as a model; it is our own dump
+        metrics = st.session_state.interaction_metrics = InteractionMetrics.model_construct(**metrics)
+    return metrics
+
+
+def _session_model(key: str, model_cls, raw: dict | None = None):
+    """Validated model of a session-state dict, rebuilt only when the dict is replaced.
+
+    run_agent swaps in new dicts rather than mutating them, so identity is
+    enough to tell when the cached model is stale. Pass raw when the caller
+    has already read the dict.
+    """
+    if "model_cache" not in st.session_state:
+        st.session_state.model_cache = {}
+    if raw is None:
+        raw = st.session_state[key]
+    hit = st.session_state.model_cache.get(key)
+    if hit is None or hit[0] is not raw:
+        hit = st.session_state.model_cache[key] = (raw, model_cls(**raw))
+    return hit[1]
+
+
+def _session_start_ts() -> float:
+    """Session start as POSIX time, parsed at most once per session."""
+    if "session_start_ts" not in st.session_state:
+        st.session_state.session_start_ts = datetime.fromisoformat(st.session_state.session_start).timestamp()
+    return st.session_state.session_start_ts
+
+
+def _session_minutes() -> int:
+    return int((time.time() - _session_start_ts()) / 60)
+
 # ============================================================
 # Helper: invoke graph
 # ============================================================
 
-def run_agent(user_input: str) -> str:
+# Minimum gap between streamed response updates
+_STREAM_INTERVAL_SECONDS = 0.1
+
+
+def _begin_turn(user_input: str, seed_package: str | None = None) -> tuple[dict, dict, datetime]:
+    """Record the message's metrics and build the graph input and config.
+
+    seed_package, a context package JSON, lets the Context Architect reuse a
+    plan instead of generating one.
+    """
     now = datetime.now()
     elapsed = (now - st.session_state.last_msg_time).total_seconds()
-    metrics = InteractionMetrics(**st.session_state.interaction_metrics)
-    metrics.message_lengths.append(len(user_input))
-    metrics.response_times.append(elapsed)
-    metrics.avg_message_length = (
-        sum(metrics.message_lengths) // len(metrics.message_lengths)
-        if metrics.message_lengths else 0
-    )
+    metrics = _session_metrics()
+    metrics.add_sample(len(user_input), elapsed)
+    metrics.avg_message_length = metrics.message_length_total // len(metrics.message_lengths)
     from utils.metrics import detect_trend
     metrics.response_time_trend = detect_trend(metrics.response_times)
     metrics.current_typing_speed = len(user_input) / max(elapsed, 1)
     if metrics.typing_speed_baseline == 0:
         metrics.typing_speed_baseline = metrics.current_typing_speed
-    st.session_state.interaction_metrics = metrics.model_dump()
     st.session_state.last_msg_time = now
 
-    try:
-        log_interaction(
-            typing_speed=metrics.current_typing_speed,
-            message_length=len(user_input),
-            response_time=elapsed,
-            session_duration=(now - datetime.fromisoformat(st.session_state.session_start)).total_seconds(),
-            task_id=st.session_state.current_task.get("task_id") if st.session_state.current_task else None,
-        )
-    except Exception:
-        pass
+    # Written off-thread while the graph runs; a failed write is ignored as before
+    _io_pool().submit(
+        log_interaction,
+        typing_speed=metrics.current_typing_speed,
+        message_length=len(user_input),
+        response_time=elapsed,
+        session_duration=now.timestamp() - _session_start_ts(),
+        task_id=st.session_state.current_task.get("task_id") if st.session_state.current_task else None,
+    )
 
     input_state = {
         "user_input": user_input,
@@ -322,7 +391,7 @@ def run_agent(user_input: str) -> str:
         "session_start": st.session_state.session_start,
         "interaction_count": st.session_state.interaction_count,
         "cognitive_state": st.session_state.cognitive,
-        "interaction_metrics": st.session_state.interaction_metrics,
+        "interaction_metrics": metrics.model_dump(),
         "pattern_detection": st.session_state.pattern_detection,
         "current_task": st.session_state.current_task,
         "dopamine_economy": st.session_state.dopamine_economy,
@@ -332,9 +401,14 @@ def run_agent(user_input: str) -> str:
         "response_retry_count": 0,       # Reset for each new interaction
         "quality_score": 1.0,            # Default high quality
         "needs_human_approval": False,   # Default no approval needed
+        "context_package_seed": seed_package,
     }
     config = {"configurable": {"thread_id": st.session_state.session_id}}
+    return input_state, config, now
 
+
+def run_agent(user_input: str, seed_package: str | None = None) -> str:
+    input_state, config, now = _begin_turn(user_input, seed_package)
     try:
         result = st.session_state.graph.invoke(input_state, config)
         
@@ -353,7 +427,92 @@ def run_agent(user_input: str) -> str:
         tb = traceback.format_exc()
         print(f"[NeuroFlow ERROR]\n{tb}")
         return f"⚠️ Something went wrong: {e}"
+    return _finish_turn(result, now)
+
+
+# Focus Studio plans are reused for an identical resubmission within this window
+PLAN_CACHE_TTL_SECONDS = 3600
+
+
+def run_agent_cached(user_input: str) -> str:
+    """run_agent for Focus Studio, reusing this session's plan for a repeated prompt.
+
+    The cache lives in session state rather than st.cache_data: a turn writes
+    the session's task and runs on its own graph thread, so it can't be shared
+    across users. A hit still runs the whole graph; only the Context Architect's
+    LLM call is skipped, by seeding it with the cached context package, so the
+    task gets a fresh id and start time like any other.
+    """
+    if "plan_cache" not in st.session_state:
+        st.session_state.plan_cache = {}
+    cache = st.session_state.plan_cache
+    hit = cache.get(user_input)
+    seed = hit[1] if hit is not None and time.time() - hit[0] < PLAN_CACHE_TTL_SECONDS else None
+
+    resp = run_agent(user_input, seed)
+    used = st.session_state.get("last_context_package")
+    if seed is None and used and not resp.startswith("⚠️"):
+        cache[user_input] = (time.time(), used)
+    return resp
+
+
+# Partial agent output streamed while a plan is being designed
+_SECTION_KEYS = ("context_output", "focus_output")
+
+
+def run_agent_stream(user_input: str, out: dict) -> Iterator[str]:
+    """Streaming run_agent: yields the response text as it is generated.
+
+    Deltas are batched to one every _STREAM_INTERVAL_SECONDS so the markdown
+    isn't re-rendered per token. The final response is left in out["response"];
+    it differs from the streamed text when the quality gate asked for a retry.
+    Until the response starts, partial plan sections (context_output,
+    focus_output) are passed to out["on_section"](key, text) if it is set.
+    """
+    input_state, config, now = _begin_turn(user_input)
+    sent, buffered = "", ""
+    last_flush = time.monotonic()
+    result = {}
+    try:
+        for payload in (input_state, None):
+            for mode, chunk in st.session_state.graph.stream(
+                payload, config, stream_mode=["custom", "values"],
+            ):
+                if mode == "values":
+                    result = chunk
+                    continue
+                if not isinstance(chunk, dict):
+                    continue
+                on_section = out.get("on_section")
+                if on_section is not None and not (sent or buffered):
+                    for key in _SECTION_KEYS:
+                        if chunk.get(key):
+                            on_section(key, chunk[key])
+                text = chunk.get("response")
+                # Only extend the first attempt; a retried response restarts the text
+                if text and text.startswith(sent + buffered):
+                    buffered += text[len(sent) + len(buffered):]
+                    if time.monotonic() - last_flush >= _STREAM_INTERVAL_SECONDS:
+                        yield buffered
+                        sent, buffered = sent + buffered, ""
+                        last_flush = time.monotonic()
+            if result.get("response"):
+                break
+            # Paused at human_approval_gate; auto-approve as run_agent does
+            print("[NeuroFlow] Human-in-the-loop: Auto-approving task plan")
+    except Exception as e:
+        tb = traceback.format_exc()
+        print(f"[NeuroFlow ERROR]\n{tb}")
+        out["response"] = f"⚠️ Something went wrong: {e}"
+        yield out["response"]
+        return
+    if buffered:
+        yield buffered
+    out["response"] = _finish_turn(result, now)
+
 
+def _finish_turn(result: dict, now: datetime) -> str:
+    """Copy the graph's state updates into the session and return the response."""
     if result.get("cognitive_state"):
         st.session_state.cognitive = result["cognitive_state"]
     if result.get("current_task"):
@@ -364,10 +523,12 @@ def run_agent(user_input: str) -> str:
         if pdet.get("current_pattern") and pdet["current_pattern"] != "none":
             st.session_state.pattern_history.append({
                 "pattern": pdet["current_pattern"],
-                "time": datetime.now().strftime("%I:%M %p"),
+                "time": now.strftime("%I:%M %p"),
             })
     if result.get("dopamine_economy"):
         st.session_state.dopamine_economy = result["dopamine_economy"]
+    # Package the Context Architect used this turn, if it ran (for plan reuse)
+    st.session_state.last_context_package = result.get("context_package_seed")
     st.session_state.interaction_count = result.get(
         "interaction_count", st.session_state.interaction_count
     )
@@ -392,10 +553,9 @@ with st.sidebar:
              background-clip: text;">NeuroFlow</div>
         <div style="font-size: 0.7rem; opacity: 0.6; margin-top: 2px;">ADHD Cognitive Support v3.0</div>
     </div>
+    <hr/>
     """, unsafe_allow_html=True)
 
-    st.markdown("---")
-
     page = st.radio(
         "NAVIGATION",
         [
@@ -413,113 +573,232 @@ with st.sidebar:
     if "page_override" in st.session_state:
         page = st.session_state.pop("page_override")
 
-    st.markdown("---")
-
-    # Sidebar mini status
-    cog = CognitiveState(**st.session_state.cognitive)
+    # Sidebar mini status (read straight from the dict; no model needed to display it)
+    cognitive = st.session_state.cognitive
+    focus_level = cognitive.get("focus_level", "medium")
     focus_colors = {"low": "🔴", "medium": "🟡", "high": "🟢", "hyperfocus": "🟣"}
 
     # Dopamine economy (from agent)
     economy = st.session_state.get("dopamine_economy", {})
-    dop_balance = economy.get("daily_balance", cog.dopamine_balance) if economy else cog.dopamine_balance
+    dopamine = cognitive.get("dopamine_balance", 50)
+    dop_balance = economy.get("daily_balance", dopamine) if economy else dopamine
     dop_forecast = economy.get("forecast", "") if economy else ""
 
-    st.markdown(f"""
-    <div style="padding: 0.5rem; font-size: 0.8rem; opacity: 0.85;">
-        <div style="margin-bottom: 0.4rem;">{focus_colors.get(cog.focus_level, '🟡')} Focus: <strong>{cog.focus_level.upper()}</strong></div>
-        <div style="margin-bottom: 0.4rem;">⚡ Energy: <strong>{cog.energy_level}/10</strong></div>
-        <div style="margin-bottom: 0.4rem;">💰 Dopamine: <strong>{dop_balance}/100</strong></div>
-        <div style="margin-bottom: 0.4rem; font-size: 0.7rem;">{dop_forecast}</div>
-        <div>⏱️ Session: <strong>{int((datetime.now() - datetime.fromisoformat(st.session_state.session_start)).total_seconds() / 60)}m</strong></div>
-    </div>
-    """, unsafe_allow_html=True)
-
     # Active task mini
     task = st.session_state.current_task
+    task_html = ""
     if task and task.get("description"):
-        st.markdown("---")
         desc = task["description"][:40] + ("..." if len(task.get("description","")) > 40 else "")
         pct = task.get("progress_percent", 0)
-        st.markdown(f"""
-        <div style="padding: 0.5rem; font-size: 0.78rem; opacity: 0.85;">
-            <div style="font-weight: 700; margin-bottom: 0.3rem;">📋 Active Task</div>
-            <div style="margin-bottom: 0.3rem;">{desc}</div>
-            <div style="background: rgba(255,255,255,0.1); border-radius: 4px; height: 6px; overflow: hidden;">
-                <div style="width: {max(pct,3)}%; height: 100%; background: var(--olive-light); border-radius: 4px;"></div>
-            </div>
-            <div style="margin-top: 0.2rem; font-size: 0.7rem;">{pct}% complete</div>
+        task_html = f"""
+    <hr/>
+    <div style="padding: 0.5rem; font-size: 0.78rem; opacity: 0.85;">
+        <div style="font-weight: 700; margin-bottom: 0.3rem;">📋 Active Task</div>
+        <div style="margin-bottom: 0.3rem;">{desc}</div>
+        <div style="background: rgba(255,255,255,0.1); border-radius: 4px; height: 6px; overflow: hidden;">
+            <div style="width: {max(pct,3)}%; height: 100%; background: var(--olive-light); border-radius: 4px;"></div>
         </div>
-        """, unsafe_allow_html=True)
+        <div style="margin-top: 0.2rem; font-size: 0.7rem;">{pct}% complete</div>
+    </div>"""
+
+    # Status and task go out as one element; the dividers are inline <hr/>s
+    st.markdown(f"""
+    <hr/>
+    <div style="padding: 0.5rem; font-size: 0.8rem; opacity: 0.85;">
+        <div style="margin-bottom: 0.4rem;">{focus_colors.get(focus_level, '🟡')} Focus: <strong>{focus_level.upper()}</strong></div>
+        <div style="margin-bottom: 0.4rem;">⚡ Energy: <strong>{cognitive.get("energy_level", 7)}/10</strong></div>
+        <div style="margin-bottom: 0.4rem;">💰 Dopamine: <strong>{dop_balance}/100</strong></div>
+        <div style="margin-bottom: 0.4rem; font-size: 0.7rem;">{dop_forecast}</div>
+        <div>⏱️ Session: <strong>{_session_minutes()}m</strong></div>
+    </div>{task_html}
+    """, unsafe_allow_html=True)
+
+
+# BPM bands as (lower bound, (card background, accent colour)), highest first
+_BPM_BANDS = (
+    (130, ("rgba(255,107,107,0.2)", "#ff6b6b")),
+    (90, ("rgba(255,217,61,0.2)", "#ffd93d")),
+    (float("-inf"), ("rgba(107,203,119,0.2)", "#6bcb77")),
+)
+_BPM_UNKNOWN = ("rgba(150,150,150,0.2)", "#999")
+
+
+def _bpm_colors(bpm) -> tuple[str, str]:
+    try:
+        bpm_val = int(bpm)
+    except (TypeError, ValueError):
+        return _BPM_UNKNOWN
+    return next(colors for floor, colors in _BPM_BANDS if bpm_val >= floor)
+
+
+def _playlist_html(playlist: list) -> str:
+    """Markup for the whole playlist, built once per generated plan.
+
+    Plans are replaced rather than mutated, so the list's identity keys the cache.
+    """
+    if "model_cache" not in st.session_state:
+        st.session_state.model_cache = {}
+    hit = st.session_state.model_cache.get("playlist_html")
+    if hit is not None and hit[0] is playlist:
+        return hit[1]
+
+    cards = []
+    for track in playlist:
+        if not isinstance(track, dict):
+            cards.append(f'<div style="margin-bottom:0.5rem;">• {track}</div>')
+            continue
+        bpm = track.get("bpm", "?")
+        bpm_bg, bpm_border = _bpm_colors(bpm)
+        cards.append(f"""<div style="background:{bpm_bg}; border-left:4px solid {bpm_border}; border-radius:8px; padding:0.7rem 1rem; margin-bottom:0.5rem;">
+<div style="display:flex; justify-content:space-between; align-items:center;">
+<strong style="font-size:0.95rem;">{track.get("section", "")}</strong>
+<span style="background:{bpm_border}; color:#000; font-weight:700; padding:2px 10px; border-radius:12px; font-size:0.8rem;">{bpm} BPM</span>
+</div>
+<div style="margin-top:0.3rem; font-size:0.9rem;">🎵 {track.get("song", "")}</div>
+<div style="margin-top:0.3rem; font-size:0.78rem; opacity:0.7;">📋 {track.get("mapped_step", "")}</div>
+</div>""")
+    html = "".join(cards)
+    st.session_state.model_cache["playlist_html"] = (playlist, html)
+    return html
+
+
+# Dashboard card markup; only the {fields} change between reruns
+_METRIC_CARD_TPL = (
+    '<div class="metric-card"><div class="metric-icon">{icon}</div>'
+    '<div class="metric-value">{value}</div>{bar}<div class="metric-label">{label}</div></div>'
+)
+_METRIC_BAR_TPL = '<div class="bar-track"><div class="{cls}" style="width:{pct}%"></div></div>'
+_ACTIVE_TASK_TPL = """
+<div class="nf-card">
+    <div class="section-header">📋 Active Task</div>
+    <div style="font-size:1.15rem;font-weight:700;">{description}</div>
+    <div class="progress-bar-container"><div class="progress-bar-fill" style="width:{bar_pct}%"><span>{pct}%</span></div></div>
+    <div class="next-step-pill">➡️ {next_ms}</div>
+    <div style="margin-top:0.5rem;font-size:0.8rem;color:var(--medium-brown);">
+        Started {elapsed}m ago • Est. {estimate}m • {remaining}m left
+    </div>
+</div>
+"""
+
+
+_FOCUS_EMOJI = {"low": "🔴", "medium": "🟡", "high": "🟢", "hyperfocus": "🟣"}
+
+
+@st.cache_data(max_entries=64, show_spinner=False)
+def _cognitive_cards(focus_level: str, energy: int, dopamine: int) -> tuple[str, str, str]:
+    """Focus, energy and dopamine card markup; rebuilt only when a value changes."""
+    return (
+        _METRIC_CARD_TPL.format(
+            icon=_FOCUS_EMOJI.get(focus_level, "🟡"),
+            value=f'<span class="focus-pill focus-{focus_level}">{focus_level.upper()}</span>',
+            bar="", label="Focus State",
+        ),
+        _METRIC_CARD_TPL.format(
+            icon="⚡", value=f"{energy}/10",
+            bar=_METRIC_BAR_TPL.format(cls="bar-fill-energy", pct=energy * 10), label="Energy",
+        ),
+        _METRIC_CARD_TPL.format(
+            icon="🔥", value=f"{dopamine}/100",
+            bar=_METRIC_BAR_TPL.format(cls="bar-fill-dopamine", pct=dopamine), label="Dopamine",
+        ),
+    )
+
+
+@st.fragment(run_every="60s")
+def _session_time_card() -> None:
+    """Session clock card; ticks on its own timer without rerunning the page."""
+    elapsed_min = _session_minutes()
+    time_str = f"{elapsed_min // 60}h {elapsed_min % 60}m" if elapsed_min >= 60 else f"{elapsed_min}m"
+    st.html(_METRIC_CARD_TPL.format(icon="⏱️", value=time_str, bar="", label="Session Time"))
+
+
+_TASK_ACTIONS = ["▶️ Go to Focus Mode", "⏸️ Pause", "🆘 Help"]
+
+
+def _on_task_action() -> None:
+    """Dispatch the active-task control before the script reruns, then clear it."""
+    action = st.session_state.d_action
+    st.session_state.d_action = None
+    if action == _TASK_ACTIONS[0]:
+        st.session_state["page_override"] = "🧘 Focus Mode"
+    elif action == _TASK_ACTIONS[1]:
+        st.session_state.current_task = {}
+    elif action == _TASK_ACTIONS[2]:
+        # The chat fragment picks this up in the same script pass
+        task = st.session_state.current_task
+        st.session_state.pending_input = f"I'm stuck on: {task.get('description', '')}"
 
 
 # ============================================================
-# PAGE: Dashboard
+# Dashboard chat (fragment)
 # ============================================================
 
-if page == "🏠 Dashboard":
-    st.markdown('<div class="page-title">🏠 Dashboard</div>', unsafe_allow_html=True)
-    st.markdown('<div class="page-subtitle">Your ADHD command center — chat with all agents at once</div>', unsafe_allow_html=True)
+# Messages rendered by default; earlier ones are mounted only on request
+_CHAT_WINDOW = 30
+# Replies longer than this show a preview until expanded
+_LONG_MESSAGE_CHARS = 4000
+_PREVIEW_CHARS = 1500
 
-    # ── Metrics Row ──
-    cog = CognitiveState(**st.session_state.cognitive)
-    session_start = datetime.fromisoformat(st.session_state.session_start)
-    elapsed_min = int((datetime.now() - session_start).total_seconds() / 60)
-    time_str = f"{elapsed_min // 60}h {elapsed_min % 60}m" if elapsed_min >= 60 else f"{elapsed_min}m"
-    focus_emoji = {"low": "🔴", "medium": "🟡", "high": "🟢", "hyperfocus": "🟣"}
-    focus_class = f"focus-{cog.focus_level}"
 
-    c1, c2, c3, c4 = st.columns(4)
-    with c1:
-        st.markdown(f'<div class="metric-card"><div class="metric-icon">{focus_emoji.get(cog.focus_level,"🟡")}</div><div class="metric-value"><span class="focus-pill {focus_class}">{cog.focus_level.upper()}</span></div><div class="metric-label">Focus State</div></div>', unsafe_allow_html=True)
-    with c2:
-        st.markdown(f'<div class="metric-card"><div class="metric-icon">⚡</div><div class="metric-value">{cog.energy_level}/10</div><div class="bar-track"><div class="bar-fill-energy" style="width:{cog.energy_level*10}%"></div></div><div class="metric-label">Energy</div></div>', unsafe_allow_html=True)
-    with c3:
-        st.markdown(f'<div class="metric-card"><div class="metric-icon">🔥</div><div class="metric-value">{cog.dopamine_balance}/100</div><div class="bar-track"><div class="bar-fill-dopamine" style="width:{cog.dopamine_balance}%"></div></div><div class="metric-label">Dopamine</div></div>', unsafe_allow_html=True)
-    with c4:
-        st.markdown(f'<div class="metric-card"><div class="metric-icon">⏱️</div><div class="metric-value">{time_str}</div><div class="metric-label">Session Time</div></div>', unsafe_allow_html=True)
+def _preview(text: str) -> str:
+    # Cut at a paragraph break so a code block or table isn't split mid-way
+    cut = text.rfind("\n\n", 0, _PREVIEW_CHARS)
+    return text[:cut if cut > 0 else _PREVIEW_CHARS] + "\n\n…"
 
-    st.markdown("<div style='height:0.6rem'></div>", unsafe_allow_html=True)
 
-    # ── Active Task Card ──
-    task = st.session_state.current_task
-    if task and task.get("description"):
-        task_info = TaskInfo(**task)
-        if task_info.start_time:
-            task_elapsed = int((datetime.now() - datetime.fromisoformat(task_info.start_time)).total_seconds() / 60)
-            remaining = max(0, task_info.estimated_duration - task_elapsed)
-        else:
-            task_elapsed = 0
-            remaining = task_info.estimated_duration
-        remaining_ms = [m for m in task_info.progress_milestones if m not in task_info.completed_milestones]
-        next_ms = remaining_ms[0] if remaining_ms else "All milestones complete! 🏆"
-        pct = task_info.progress_percent
-        st.markdown(f"""
-        <div class="nf-card">
-            <div class="section-header">📋 Active Task</div>
-            <div style="font-size:1.15rem;font-weight:700;">{task_info.description}</div>
-            <div class="progress-bar-container"><div class="progress-bar-fill" style="width:{max(pct,3)}%"><span>{pct}%</span></div></div>
-            <div class="next-step-pill">➡️ {next_ms}</div>
-            <div style="margin-top:0.5rem;font-size:0.8rem;color:var(--medium-brown);">
-                Started {task_elapsed}m ago • Est. {task_info.estimated_duration}m • {remaining}m left
-            </div>
-        </div>
-        """, unsafe_allow_html=True)
+def _render_messages(messages: list[dict], start: int = 0) -> None:
+    """Render chat messages; start is the first message's index in the history."""
+    for i, msg in enumerate(messages, start):
+        avatar = "🧠" if msg["role"] == "assistant" else "👤"
+        with st.chat_message(msg["role"], avatar=avatar):
+            content = msg["content"]
+            if len(content) <= _LONG_MESSAGE_CHARS:
+                st.markdown(content)
+            elif st.toggle("Show full response", key=f"chat_full_{i}"):
+                st.markdown(content)
+            else:
+                st.markdown(_preview(content))
+
+
+def _dashboard_state() -> tuple:
+    """What the metric cards, task card and sidebar render from."""
+    return (
+        st.session_state.cognitive,
+        st.session_state.current_task,
+        st.session_state.dopamine_economy,
+    )
 
-        tc1, tc2, tc3 = st.columns(3)
-        with tc1:
-            if st.button("▶️ Go to Focus Mode", key="d_focus_mode", use_container_width=True):
-                st.session_state["page_override"] = "🧘 Focus Mode"
-                st.rerun()
-        with tc2:
-            if st.button("⏸️ Pause", key="d_pause", use_container_width=True):
-                st.session_state.current_task = {}
-                st.rerun()
-        with tc3:
-            if st.button("🆘 Help", key="d_help", use_container_width=True):
-                st.session_state.pending_input = f"I'm stuck on: {task_info.description}"
-                st.rerun()
 
-    # ── Chat Interface ──
+def _chat_turn(text: str) -> None:
+    st.session_state.chat_history.append({"role": "user", "content": text})
+    with st.chat_message("user", avatar="👤"):
+        st.markdown(text)
+    before = _dashboard_state()
+    with st.chat_message("assistant", avatar="🧠"):
+        # Plan sections show here as they close, until the reply starts
+        preview, sections = st.empty(), {}
+
+        def show_section(key: str, section: str) -> None:
+            sections[key] = section
+            preview.markdown("\n\n".join(sections.values()))
+
+        out = {"on_section": show_section}
+        placeholder = st.empty()
+        streamed = placeholder.write_stream(run_agent_stream(text, out))
+        preview.empty()
+        resp = out.get("response") or "I'm having trouble responding. Please try again."
+        if streamed != resp:
+            placeholder.markdown(resp)
+    st.session_state.chat_history.append({"role": "assistant", "content": resp})
+    # The new messages are already on screen; only redraw the whole page when
+    # the turn changed something outside the chat
+    if _dashboard_state() != before:
+        st.rerun()
+
+
+@st.fragment
+def _chat_fragment():
+    """Chat history and input; a submission reruns only this subtree."""
     st.markdown('<div class="section-header">💬 NeuroFlow Chat</div>', unsafe_allow_html=True)
 
     if not st.session_state.chat_history:
@@ -534,34 +813,77 @@ if page == "🏠 Dashboard":
                 "Type below or use the sidebar pages for specialized help!"
             )
 
-    for msg in st.session_state.chat_history:
-        avatar = "🧠" if msg["role"] == "assistant" else "👤"
-        with st.chat_message(msg["role"], avatar=avatar):
-            st.markdown(msg["content"])
+    history = st.session_state.chat_history
+    older, recent = history[:-_CHAT_WINDOW], history[-_CHAT_WINDOW:]
+    if older and st.toggle(f"Show {len(older)} earlier messages", key="chat_show_older"):
+        _render_messages(older)
+    _render_messages(recent, len(older))
 
     # Handle pending input
     if "pending_input" in st.session_state:
-        pending = st.session_state.pop("pending_input")
-        st.session_state.chat_history.append({"role": "user", "content": pending})
-        with st.chat_message("user", avatar="👤"):
-            st.markdown(pending)
-        with st.chat_message("assistant", avatar="🧠"):
-            with st.spinner("🧠 Thinking..."):
-                resp = run_agent(pending)
-            st.markdown(resp)
-        st.session_state.chat_history.append({"role": "assistant", "content": resp})
-        st.rerun()
+        _chat_turn(st.session_state.pop("pending_input"))
 
     if user_input := st.chat_input("Tell me what you'd like to work on..."):
-        st.session_state.chat_history.append({"role": "user", "content": user_input})
-        with st.chat_message("user", avatar="👤"):
-            st.markdown(user_input)
-        with st.chat_message("assistant", avatar="🧠"):
-            with st.spinner("🧠 Thinking..."):
-                resp = run_agent(user_input)
-            st.markdown(resp)
-        st.session_state.chat_history.append({"role": "assistant", "content": resp})
-        st.rerun()
+        _chat_turn(user_input)
+
+
+# ============================================================
+# PAGE: Dashboard
+# ============================================================
+
+if page == "🏠 Dashboard":
+    # Session values this page reads, fetched through the state proxy once per rerun
+    current_task = st.session_state.current_task
+    cognitive = st.session_state.cognitive
+    st.markdown('<div class="page-title">🏠 Dashboard</div>', unsafe_allow_html=True)
+    st.markdown('<div class="page-subtitle">Your ADHD command center — chat with all agents at once</div>', unsafe_allow_html=True)
+
+    # ── Metrics Row ──
+    cog = _session_model("cognitive", CognitiveState, cognitive)
+    focus_card, energy_card, dopamine_card = _cognitive_cards(
+        cog.focus_level, cog.energy_level, cog.dopamine_balance,
+    )
+
+    c1, c2, c3, c4 = st.columns(4)
+    with c1:
+        st.html(focus_card)
+    with c2:
+        st.html(energy_card)
+    with c3:
+        st.html(dopamine_card)
+    with c4:
+        _session_time_card()
+
+    st.markdown("<div style='height:0.6rem'></div>", unsafe_allow_html=True)
+
+    # ── Active Task Card ──
+    if current_task and current_task.get("description"):
+        task_info = _session_model("current_task", TaskInfo, current_task)
+        if task_info.start_time:
+            task_elapsed = minutes_since(task_info.start_time)
+            remaining = max(0, task_info.estimated_duration - task_elapsed)
+        else:
+            task_elapsed = 0
+            remaining = task_info.estimated_duration
+        completed = set(task_info.completed_milestones)
+        next_ms = next(
+            (m for m in task_info.progress_milestones if m not in completed),
+            "All milestones complete! 🏆",
+        )
+        pct = task_info.progress_percent
+        st.html(_ACTIVE_TASK_TPL.format(
+            description=task_info.description, bar_pct=max(pct, 3), pct=pct, next_ms=next_ms,
+            elapsed=task_elapsed, estimate=task_info.estimated_duration, remaining=remaining,
+        ))
+
+        # One control for the three task actions; dispatched in _on_task_action
+        st.segmented_control(
+            "Task action", _TASK_ACTIONS, key="d_action",
+            on_change=_on_task_action, label_visibility="collapsed",
+        )
+
+    # ── Chat Interface ──
+    _chat_fragment()
 
 
 # ============================================================
@@ -617,17 +939,17 @@ elif page == "🎯 Focus Studio":
         )
 
         with st.spinner("🧠 NeuroFlow agents are designing your focus environment..."):
-            resp = run_agent(enriched)
+            resp = run_agent_cached(enriched)
 
         st.markdown("---")
         st.markdown(resp)
         st.balloons()
     
-    # Show current task if exists
+    # Show current task if exists (read after the agent run, which replaces it)
     task = st.session_state.current_task
     if task and task.get("description"):
         st.markdown("---")
-        task_info = TaskInfo(**task)
+        task_info = _session_model("current_task", TaskInfo, task)
         env = task_info.environment
         
         st.markdown(f"### 📋 Active Task: {task_info.description}")
@@ -637,12 +959,26 @@ elif page == "🎯 Focus Studio":
         if steps:
             st.markdown("#### ✅ Your Step-by-Step Plan")
             st.caption("Check off each step as you complete it — each checkbox = dopamine hit 🎯")
+            # One editor widget for the whole plan rather than a checkbox per step
+            steps_done = st.session_state.get("studio_steps_done", {})
+            rows = []
             for i, s in enumerate(steps, 1):
-                step_text = s.get("step", s) if isinstance(s, dict) else str(s)
-                reward = s.get("dopamine_reward", "+🧠") if isinstance(s, dict) else "+🧠"
-                checked = st.checkbox(f"{step_text}  ({reward})", key=f"studio_step_{i}")
-                if checked:
-                    st.session_state[f"step_{i}_done"] = True
+                rows.append({
+                    "Done": steps_done.get(i, False),
+                    "Step": s.get("step", s) if isinstance(s, dict) else str(s),
+                    "Reward": s.get("dopamine_reward", "+🧠") if isinstance(s, dict) else "+🧠",
+                })
+            edited = st.data_editor(
+                rows,
+                column_config={"Done": st.column_config.CheckboxColumn("Done", width="small")},
+                disabled=["Step", "Reward"],
+                hide_index=True,
+                use_container_width=True,
+                key="studio_steps",
+            )
+            st.session_state.studio_steps_done = {
+                i: bool(row["Done"]) for i, row in enumerate(edited, 1)
+            }
         
         # ── BPM-Mapped Playlist ──
         env_data = task.get("environment", {})
@@ -655,54 +991,17 @@ elif page == "🎯 Focus Studio":
             st.markdown("#### 🎶 Your Focus Playlist (BPM-Mapped)")
             st.caption("Songs matched to each work phase — BPM follows HIGH → LOW → HIGH → LOW pattern")
             
-            for track in playlist:
-                if isinstance(track, dict):
-                    section = track.get("section", "")
-                    song = track.get("song", "")
-                    bpm = track.get("bpm", "?")
-                    mapped_step = track.get("mapped_step", "")
-                    reason = track.get("reason", "")
-                    
-                    # Color-code BPM
-                    try:
-                        bpm_val = int(bpm)
-                        if bpm_val >= 130:
-                            bpm_bg = "rgba(255,107,107,0.2)"
-                            bpm_border = "#ff6b6b"
-                            bpm_label = "🔴 HIGH"
-                        elif bpm_val >= 90:
-                            bpm_bg = "rgba(255,217,61,0.2)"
-                            bpm_border = "#ffd93d"
-                            bpm_label = "🟡 MED"
-                        else:
-                            bpm_bg = "rgba(107,203,119,0.2)"
-                            bpm_border = "#6bcb77"
-                            bpm_label = "🟢 LOW"
-                    except:
-                        bpm_bg = "rgba(150,150,150,0.2)"
-                        bpm_border = "#999"
-                        bpm_label = "⚪"
-                    
-                    st.markdown(f"""<div style="background:{bpm_bg}; border-left:4px solid {bpm_border}; border-radius:8px; padding:0.7rem 1rem; margin-bottom:0.5rem;">
-<div style="display:flex; justify-content:space-between; align-items:center;">
-<strong style="font-size:0.95rem;">{section}</strong>
-<span style="background:{bpm_border}; color:#000; font-weight:700; padding:2px 10px; border-radius:12px; font-size:0.8rem;">{bpm} BPM</span>
-</div>
-<div style="margin-top:0.3rem; font-size:0.9rem;">🎵 {song}</div>
-<div style="margin-top:0.3rem; font-size:0.78rem; opacity:0.7;">📋 {mapped_step}</div>
-</div>""", unsafe_allow_html=True)
-                else:
-                    st.markdown(f"- {track}")
+            # One element for the whole playlist rather than one per track
+            st.html(_playlist_html(playlist))
         
         # ── Break Activities ──
         breaks = env_data.get("break_activities", [])
         if breaks:
             st.markdown("#### 💃 Break Activities")
-            for b in breaks[:4]:
-                st.markdown(f"- {b}")
+            st.markdown("\n".join(f"- {b}" for b in breaks[:4]))
         
         # ── Environment Preview ──
-        st.markdown(f"""
+        st.html(f"""
         <div class="nf-card">
             <div class="section-header">🛠️ Virtual Environment Setup</div>
             <div style="display:flex; gap:1rem; flex-wrap:wrap;">
@@ -714,7 +1013,7 @@ elif page == "🎯 Focus Studio":
                 <em>Go to the <strong>🧘 Focus Mode</strong> page to launch this environment with Alex!</em>
             </div>
         </div>
-        """, unsafe_allow_html=True)
+        """)
 
 
 # ============================================================
@@ -728,7 +1027,7 @@ elif page == "🧘 Focus Mode":
     if not task:
         st.info("No active task! Go to **🎯 Focus Studio** to start a task first.")
     else:
-        task_info = TaskInfo(**task)
+        task_info = _session_model("current_task", TaskInfo)
         env = task_info.environment
         
         # ── Sidebar: Thought Parking + Session Summary ──
@@ -736,7 +1035,7 @@ elif page == "🧘 Focus Mode":
             st.markdown("---")
             
             import random
-            session_mins = int((datetime.now() - datetime.fromisoformat(st.session_state.session_start)).total_seconds() / 60)
+            session_mins = _session_minutes()
             sessions_done = st.session_state.get("timer_sessions_completed", 0)
             alex_rewards = st.session_state.get("alex_rewards", 0)
             
@@ -961,7 +1260,7 @@ elif page == "🧘 Focus Mode":
             st.markdown("### 👤 Alex — Focus Partner")
             
             import random
-            session_mins = int((datetime.now() - datetime.fromisoformat(st.session_state.session_start)).total_seconds() / 60)
+            session_mins = _session_minutes()
             sessions_done = st.session_state.get("timer_sessions_completed", 0)
             alex_rewards = st.session_state.get("alex_rewards", 0)
             
@@ -1086,8 +1385,8 @@ elif page == "📊 Cognitive Monitor":
     st.markdown('<div class="page-title">📊 Cognitive Monitor</div>', unsafe_allow_html=True)
     st.markdown('<div class="page-subtitle">Real-time cognitive state analysis — your brain\'s dashboard</div>', unsafe_allow_html=True)
 
-    cog = CognitiveState(**st.session_state.cognitive)
-    metrics = InteractionMetrics(**st.session_state.interaction_metrics)
+    cog = _session_model("cognitive", CognitiveState)
+    metrics = _session_metrics()
 
     # ── State Overview ──
     st.markdown("### 🧠 Current Cognitive State")
@@ -1129,14 +1428,14 @@ elif page == "📊 Cognitive Monitor":
         st.metric("Avg Message Length", f"{metrics.avg_message_length} chars")
         st.metric("Typing Speed", f"{metrics.current_typing_speed:.1f} c/s")
     with m2:
-        st.metric("Messages This Session", f"{len(metrics.message_lengths)}")
+        st.metric("Messages This Session", f"{metrics.message_count or len(metrics.message_lengths)}")
         st.metric("Response Time Trend", metrics.response_time_trend or "stable")
     with m3:
         st.metric("Speed Baseline", f"{metrics.typing_speed_baseline:.1f} c/s")
         last_break = metrics.last_break
         if last_break:
             try:
-                mins_since = int((datetime.now() - datetime.fromisoformat(last_break)).total_seconds() / 60)
+                mins_since = minutes_since(last_break)
                 st.metric("Last Break", f"{mins_since}m ago")
             except Exception:
                 st.metric("Last Break", "Unknown")
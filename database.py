@@ -5,11 +5,15 @@ Creates tables and provides CRUD helpers for structured data.
 
 import sqlite3
 import os
+import time
 from datetime import datetime
 from typing import Optional
 
 
-DB_PATH = os.path.join(os.path.dirname(__file__), "data", "neuroflow.db")
+# Overridable so tests and scratch runs don't write to the bundled database
+DB_PATH = os.environ.get(
+    "NEUROFLOW_DB_PATH", os.path.join(os.path.dirname(__file__), "data", "neuroflow.db"),
+)
 
 
 def _get_conn() -> sqlite3.Connection:
@@ -24,6 +28,8 @@ def init_db() -> None:
     """Create all tables if they don't exist."""
     conn = _get_conn()
     cur = conn.cursor()
+    # WAL lets background writers commit without blocking readers
+    cur.execute("PRAGMA journal_mode=WAL")
 
     cur.execute("""
         CREATE TABLE IF NOT EXISTS interaction_metrics (
@@ -130,6 +136,21 @@ def log_pattern_event(
 
 # ---- Task History ----
 
+# Bumped on every task_history write so readers can tell when cached
+# derivations of the table are stale
+_task_history_version = 0
+
+# get_task_history results keyed by limit; an entry is reused until the version
+# moves or the TTL lapses (the TTL covers writes from other processes)
+TASK_HISTORY_CACHE_TTL_SECONDS = 60
+_task_history_cache: dict[int, tuple[float, int, list[dict]]] = {}
+
+
+def task_history_version() -> int:
+    """Return a counter that changes whenever task_history is written."""
+    return _task_history_version
+
+
 def save_task(
     task_id: str,
     description: str,
@@ -150,15 +171,27 @@ def save_task(
     conn.commit()
     conn.close()
 
+    global _task_history_version
+    _task_history_version += 1
+
 
 def get_task_history(limit: int = 50) -> list[dict]:
+    now = time.monotonic()
+    version = _task_history_version
+    hit = _task_history_cache.get(limit)
+    if hit is not None and hit[1] == version and now - hit[0] < TASK_HISTORY_CACHE_TTL_SECONDS:
+        # Fresh row dicts so a caller's edits can't leak into later hits
+        return [dict(row) for row in hit[2]]
+
     conn = _get_conn()
     rows = conn.execute(
         "SELECT * FROM task_history ORDER BY completion_date DESC LIMIT ?",
         (limit,),
     ).fetchall()
     conn.close()
-    return [dict(r) for r in rows]
+    history = [dict(r) for r in rows]
+    _task_history_cache[limit] = (now, version, history)
+    return [dict(row) for row in history]
 
 
 # ---- Time Blocks ----
@@ -15,17 +15,19 @@ import traceback
 
 from langgraph.graph import StateGraph, END
 from langgraph.checkpoint.memory import MemorySaver
-from langchain_google_genai import ChatGoogleGenerativeAI
 from langchain_core.messages import HumanMessage, SystemMessage, AIMessage
+from langchain_core.runnables import RunnableLambda
 
 from state import NeuroFlowState
-from agents.session_manager import session_manager_node
+from agents.session_manager import session_manager_node, asession_manager_node
 from agents.cognitive_predictor import cognitive_predictor_node
 from agents.context_architect import context_architect_node
-from agents.pattern_interrupt import pattern_interrupt_node
+from agents.pattern_interrupt import pattern_interrupt_node, apattern_interrupt_node
 from agents.time_reality import time_reality_node
-from agents.focus_builder import focus_builder_node
+from agents.focus_builder import focus_builder_node, afocus_builder_node
 from agents.dopamine_manager import dopamine_manager_node
+from utils.llm import get_llm
+from utils.streaming import stream_writer
 
 
 # ============================================================
@@ -55,6 +57,8 @@ Your personality:
 10. Use markdown formatting for structure (headers, bold, lists)
 11. End with a clear next action when appropriate"""
 
+_RESPONSE_SYSTEM_MESSAGE = SystemMessage(content=_RESPONSE_SYSTEM)
+
 
 def response_generator_node(state: dict) -> dict:
     """Synthesise all agent outputs into one cohesive, personality-rich response."""
@@ -104,13 +108,18 @@ def response_generator_node(state: dict) -> dict:
         "the balance and recommendation naturally. Be warm, direct, and ADHD-friendly."
     )
 
+    # Stream so the UI can show the reply as it's written (custom stream channel)
+    emit = stream_writer()
     try:
-        llm = ChatGoogleGenerativeAI(model="gemini-flash-lite-latest", temperature=0.7)
-        response = llm.invoke([
-            SystemMessage(content=_RESPONSE_SYSTEM),
+        final = ""
+        for chunk in get_llm(0.7).stream([
+            _RESPONSE_SYSTEM_MESSAGE,
             HumanMessage(content=prompt),
-        ])
-        final = response.content.strip()
+        ]):
+            final += chunk.content
+            if emit is not None:
+                emit({"response": final})
+        final = final.strip()
     except Exception as e:
         print(f"[NeuroFlow] Response generator error: {e}")
         if context_output:
@@ -337,12 +346,14 @@ def build_graph():
     graph = StateGraph(NeuroFlowState)
 
     # ── Register all nodes ──
-    graph.add_node("session_manager", session_manager_node)
+    # LLM-bound agents carry an async twin: graph.ainvoke() awaits ainvoke()
+    # so parallel branches overlap their Gemini calls; invoke() stays sync.
+    graph.add_node("session_manager", RunnableLambda(session_manager_node, afunc=asession_manager_node))
     graph.add_node("context_architect", context_architect_node)
     graph.add_node("human_approval_gate", human_approval_gate_node)
-    graph.add_node("focus_builder", focus_builder_node)
+    graph.add_node("focus_builder", RunnableLambda(focus_builder_node, afunc=afocus_builder_node))
     graph.add_node("cognitive_predictor", cognitive_predictor_node)
-    graph.add_node("pattern_interrupt", pattern_interrupt_node)
+    graph.add_node("pattern_interrupt", RunnableLambda(pattern_interrupt_node, afunc=apattern_interrupt_node))
     graph.add_node("pattern_escalation", pattern_escalation_node)
     graph.add_node("time_reality", time_reality_node)
     graph.add_node("dopamine_manager", dopamine_manager_node)
@@ -31,6 +31,11 @@ class CognitiveState(BaseModel):
     crash_prediction: CrashPrediction = Field(default_factory=CrashPrediction)
 
 
+# Samples kept per metric series; older ones are dropped so a long session's
+# state stays a fixed size
+METRICS_WINDOW = 64
+
+
 class InteractionMetrics(BaseModel):
     typing_speed_baseline: float = 0.0
     current_typing_speed: float = 0.0
@@ -39,6 +44,26 @@ class InteractionMetrics(BaseModel):
     last_break: Optional[str] = None          # ISO timestamp
     message_lengths: list[int] = Field(default_factory=list)
     response_times: list[float] = Field(default_factory=list)
+    message_length_total: int = 0             # running sum of message_lengths
+    message_count: int = 0                    # messages this session, including dropped samples
+
+    def add_sample(self, message_length: int, response_time: float) -> None:
+        """Record one interaction; use this instead of appending to the lists."""
+        if self.message_lengths and not self.message_length_total:
+            # Cold start: state from before the running total existed
+            self.message_length_total = sum(self.message_lengths)
+        self.message_count = max(self.message_count, len(self.message_lengths)) + 1
+        self.message_lengths.append(message_length)
+        self.message_length_total += message_length
+        self.response_times.append(response_time)
+
+        excess = len(self.message_lengths) - METRICS_WINDOW
+        if excess > 0:
+            self.message_length_total -= sum(self.message_lengths[:excess])
+            del self.message_lengths[:excess]
+        excess = len(self.response_times) - METRICS_WINDOW
+        if excess > 0:
+            del self.response_times[:excess]
 
 
 class PatternDetection(BaseModel):
@@ -49,6 +74,7 @@ class PatternDetection(BaseModel):
     pattern_start_time: Optional[str] = None  # ISO timestamp
     interventions_attempted: list[str] = Field(default_factory=list)
     sentiment_trajectory: list[float] = Field(default_factory=list)  # -1 to 1
+    history_hash: str = ""  # digest of the messages the last detection saw
 
 
 # ---------------------------------------------------------------------------
@@ -70,6 +96,8 @@ class DopamineEconomy(BaseModel):
     forecast: str = ""                # "☀️ High energy" / "⛈️ Low energy"
     next_reward_minutes: int = 0      # minutes until next variable reward
     reward_schedule: list[int] = Field(default_factory=list)  # e.g. [8,15,27,35]
+    reward_schedule_task_id: str = ""  # task the schedule was drawn for
+    last_output: str = ""             # rendered summary, reused on turns with no events
 
 
 # ---------------------------------------------------------------------------
@@ -193,6 +221,9 @@ class NeuroFlowState(TypedDict, total=False):
     focus_output: str           # Focus Environment Builder output
     dopamine_output: str        # Dopamine Economy Manager output
 
+    # Context package JSON: set on input to reuse a plan, returned as the one used
+    context_package_seed: Optional[str]
+
     # Advanced graph control fields
     pattern_escalation_level: int   # 0=initial, 1=escalated, 2=max (cyclic loop counter)
     response_retry_count: int       # Self-correction loop counter (max 1 retry)
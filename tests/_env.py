@@ -0,0 +1,55 @@
+"""Shared test setup: import the app modules against a throwaway database.
+
+The agents import the LangGraph/LangChain stack at module level even where
+the code under test never touches it. When those packages aren't installed,
+minimal stand-ins are registered so the suite still runs on its own; the
+real packages are always preferred.
+"""
+
+import importlib
+import os
+import sys
+import tempfile
+import types
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+os.environ.setdefault(
+    "NEUROFLOW_DB_PATH", os.path.join(tempfile.mkdtemp(prefix="neuroflow-test-"), "neuroflow.db"),
+)
+
+
+class _Message:
+    def __init__(self, content="", **kwargs):
+        self.content = content
+        self.__dict__.update(kwargs)
+
+
+class _UnavailableLLM:
+    def __init__(self, *args, **kwargs):
+        raise RuntimeError("langchain_google_genai is not installed")
+
+
+def _stub(name: str, **attrs) -> None:
+    """Register a stand-in module unless the real one imports."""
+    try:
+        importlib.import_module(name)
+        return
+    except ImportError:
+        pass
+    parent, _, child = name.rpartition(".")
+    if parent:
+        _stub(parent)
+    module = sys.modules.get(name) or types.ModuleType(name)
+    for key, value in attrs.items():
+        setattr(module, key, value)
+    sys.modules[name] = module
+    if parent:
+        setattr(sys.modules[parent], child, module)
+
+
+_stub("langgraph.graph.message", add_messages=lambda left, right: left + right)
+_stub("langchain_core.messages", HumanMessage=_Message, SystemMessage=_Message, AIMessage=_Message)
+_stub("langchain_google_genai", ChatGoogleGenerativeAI=_UnavailableLLM)
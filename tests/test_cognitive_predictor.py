@@ -0,0 +1,114 @@
+import math
+import random
+import unittest
+
+import numpy as np
+
+from tests import _env  # noqa: F401  (sets NEUROFLOW_DB_PATH and import stand-ins)
+from agents.cognitive_predictor import (
+    WEIGHTS,
+    CrashScore,
+    _FACTOR_KEYS,
+    _compute_crash_score,
+    _compute_crash_scores_batch,
+    _generate_intervention,
+)
+from state import InteractionMetrics
+
+
+def _ema(values, alpha=0.3):
+    ema = values[0]
+    for v in values[1:]:
+        ema = alpha * v + (1 - alpha) * ema
+    return ema
+
+
+def _reference_factors(m: InteractionMetrics, session_minutes: float, mins_since_break: int) -> dict:
+    """The original dict-based scoring, kept as the oracle for the NumPy kernel."""
+    f = {}
+    if m.typing_speed_baseline > 0 and m.current_typing_speed > 0:
+        f["typing_speed_decline"] = max(0, 1.0 - m.current_typing_speed / m.typing_speed_baseline)
+    else:
+        f["typing_speed_decline"] = 0.0
+
+    f["message_length_trend"] = 0.0
+    if len(m.message_lengths) >= 3:
+        lengths = [float(x) for x in m.message_lengths]
+        overall = sum(lengths) / len(lengths)
+        if overall > 0:
+            f["message_length_trend"] = min(max(0, 1.0 - _ema(lengths[-5:]) / overall) * 2, 1.0)
+
+    f["response_time_trend"] = 0.0
+    if len(m.response_times) >= 3:
+        times = m.response_times[-8:]
+        early = _ema(times[:3])
+        if early > 0:
+            f["response_time_trend"] = min(max(0, (_ema(times[-3:]) - early) / early), 1.0)
+
+    f["session_duration"] = (
+        1.0 / (1.0 + math.exp(-(session_minutes - 90) / 20)) if session_minutes > 0 else 0.0
+    )
+    f["break_overdue"] = min(1.0, (mins_since_break - 45) / 45) if mins_since_break >= 45 else 0.0
+
+    f["topic_drift"] = 0.0
+    if len(m.message_lengths) >= 4:
+        recent = m.message_lengths[-4:]
+        mean = sum(recent) / len(recent)
+        f["topic_drift"] = min(1.0, sum((x - mean) ** 2 for x in recent) / len(recent) / 5000)
+    return f
+
+
+def _random_case(rng: random.Random):
+    n_msgs = rng.randint(0, 12)
+    lengths = [rng.randint(1, 400) for _ in range(n_msgs)]
+    metrics = InteractionMetrics(
+        typing_speed_baseline=rng.choice([0.0, rng.uniform(1, 10)]),
+        current_typing_speed=rng.choice([0.0, rng.uniform(1, 10)]),
+        message_lengths=lengths,
+        response_times=[rng.uniform(0, 300) for _ in range(rng.randint(0, 12))],
+        message_length_total=sum(lengths),
+    )
+    return metrics, rng.uniform(0, 400), rng.randint(0, 200)
+
+
+class CrashScoreEquivalenceTest(unittest.TestCase):
+    def test_kernel_matches_original_scoring(self):
+        rng = random.Random(7)
+        for _ in range(300):
+            metrics, session_minutes, since_break = _random_case(rng)
+            expected = _reference_factors(metrics, session_minutes, since_break)
+            score = _compute_crash_score(metrics, session_minutes, since_break)
+            for key in _FACTOR_KEYS:
+                self.assertAlmostEqual(score.factors[key], expected[key], delta=1e-3, msg=key)
+            overall = round(min(sum(WEIGHTS[k] * expected[k] for k in WEIGHTS), 1.0), 3)
+            self.assertAlmostEqual(score.overall, overall, delta=1e-3)
+
+    def test_batch_matches_single(self):
+        rng = random.Random(11)
+        cases = [_random_case(rng) for _ in range(50)]
+        batch = _compute_crash_scores_batch(
+            [c[0] for c in cases],
+            np.array([c[1] for c in cases]),
+            np.array([c[2] for c in cases]),
+        )
+        for (metrics, session_minutes, since_break), got in zip(cases, batch):
+            single = _compute_crash_score(metrics, session_minutes, since_break)
+            np.testing.assert_allclose(got.vec, single.vec, atol=1e-3)
+            self.assertAlmostEqual(got.overall, single.overall, delta=1e-3)
+
+    def test_factor_order_matches_original_dict(self):
+        self.assertEqual(_FACTOR_KEYS, (
+            "typing_speed_decline", "message_length_trend", "response_time_trend",
+            "session_duration", "break_overdue", "topic_drift",
+        ))
+
+    def test_critical_evidence_lists_session_before_break(self):
+        vec = np.zeros(len(_FACTOR_KEYS))
+        for key in ("typing_speed_decline", "session_duration", "break_overdue"):
+            vec[_FACTOR_KEYS.index(key)] = 1.0
+        message = _generate_intervention("low", CrashScore(0.8, vec, (0.0, 0.0)), 120)
+        self.assertIn("typing speed decline, session duration", message)
+
+
+if __name__ == "__main__":
+    unittest.main()
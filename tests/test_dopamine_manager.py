@@ -0,0 +1,75 @@
+import unittest
+
+from tests import _env  # noqa: F401  (sets NEUROFLOW_DB_PATH before import)
+from agents.dopamine_manager import dopamine_manager_node
+
+
+class NoEventTurnTest(unittest.TestCase):
+    def test_quiet_turn_does_not_repeat_previous_transactions(self):
+        task = {"task_id": "t1", "description": "Write essay", "estimated_duration": 45}
+        first = dopamine_manager_node({
+            "intent": "start_task", "current_task": task,
+            "cognitive_state": {"energy_level": 7},
+        })
+        self.assertIn("📝 **Recent**:", first["dopamine_output"])
+        self.assertIn("Started: Write essay", first["dopamine_output"])
+
+        second = dopamine_manager_node({
+            "intent": "general_chat", "current_task": task,
+            "cognitive_state": {"energy_level": 7},
+            "dopamine_economy": first["dopamine_economy"],
+        })
+        out = second["dopamine_output"]
+        self.assertNotIn("📝 **Recent**:", out)
+        self.assertNotIn("Started: Write essay", out)
+        balance = first["dopamine_economy"]["daily_balance"]
+        self.assertIn(f"💰 **Dopamine Balance**: {balance}/100", out)
+        self.assertEqual(second["dopamine_economy"]["daily_balance"], balance)
+
+    def test_quiet_turn_after_pause_drops_old_schedule(self):
+        task = {"task_id": "t1", "description": "Write essay", "estimated_duration": 45}
+        first = dopamine_manager_node({
+            "intent": "start_task", "current_task": task,
+            "cognitive_state": {"energy_level": 7},
+        })
+        paused = dopamine_manager_node({
+            "intent": "general_chat", "current_task": {},
+            "cognitive_state": {"energy_level": 7},
+            "dopamine_economy": first["dopamine_economy"],
+        })
+        economy = paused["dopamine_economy"]
+        self.assertIsNot(economy, first["dopamine_economy"])
+        self.assertEqual(economy["reward_schedule_task_id"], "")
+        self.assertEqual(economy["daily_balance"], first["dopamine_economy"]["daily_balance"])
+        self.assertNotIn("📝 **Recent**:", paused["dopamine_output"])
+
+
+class RewardScheduleTest(unittest.TestCase):
+    def _turn(self, task: dict, economy: dict | None = None, intent: str = "check_progress") -> dict:
+        state = {"intent": intent, "current_task": task, "cognitive_state": {"energy_level": 6}}
+        if economy is not None:
+            state["dopamine_economy"] = economy
+        return dopamine_manager_node(state)["dopamine_economy"]
+
+    def test_schedule_is_kept_for_the_same_task(self):
+        task = {"task_id": "t1", "description": "Study chapter 4", "estimated_duration": 60}
+        first = self._turn(task, intent="start_task")
+        self.assertEqual(first["reward_schedule_task_id"], "t1")
+        self.assertTrue(first["reward_schedule"])
+        self.assertEqual(first["next_reward_minutes"], first["reward_schedule"][0])
+
+        for _ in range(3):
+            economy = self._turn(task, first)
+            self.assertEqual(economy["reward_schedule"], first["reward_schedule"])
+            self.assertEqual(economy["next_reward_minutes"], first["reward_schedule"][0])
+
+    def test_new_task_gets_a_new_schedule(self):
+        first = self._turn({"task_id": "t1", "description": "Study", "estimated_duration": 60}, intent="start_task")
+        second = self._turn({"task_id": "t2", "description": "Email", "estimated_duration": 20}, first, intent="start_task")
+        self.assertEqual(second["reward_schedule_task_id"], "t2")
+        self.assertTrue(second["reward_schedule"])
+        self.assertEqual(second["next_reward_minutes"], second["reward_schedule"][0])
+
+
+if __name__ == "__main__":
+    unittest.main()
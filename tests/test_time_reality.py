@@ -0,0 +1,105 @@
+import random
+import sqlite3
+import unittest
+import uuid
+
+from tests import _env  # noqa: F401  (sets NEUROFLOW_DB_PATH and import stand-ins)
+import database
+from agents.time_reality import _get_historical_stats
+from utils.metrics import user_estimate_minutes
+
+
+class UserEstimateTest(unittest.TestCase):
+    def test_unit_beats_hyphenated_number(self):
+        self.assertEqual(user_estimate_minutes("Write a 5-page essay, I think 60 minutes"), 60)
+
+    def test_unit_beats_ordinal_number(self):
+        self.assertEqual(user_estimate_minutes("chapter 3, about 45 min"), 45)
+        self.assertEqual(user_estimate_minutes("Review the 2nd draft in 30m"), 30)
+
+    def test_hours_are_converted(self):
+        self.assertEqual(user_estimate_minutes("finish the report, maybe 2 hours"), 120)
+        self.assertEqual(user_estimate_minutes("clean the kitchen 1hr"), 60)
+
+    def test_decimal_hours_are_not_misread(self):
+        self.assertIsNone(user_estimate_minutes("about 1.5 hours"))
+
+    def test_bare_number_fallback(self):
+        self.assertEqual(user_estimate_minutes("math homework 40"), 40)
+        self.assertIsNone(user_estimate_minutes("write a 5-page essay"))
+
+    def test_out_of_range_is_ignored(self):
+        self.assertIsNone(user_estimate_minutes("takes 600 minutes"))
+        self.assertEqual(user_estimate_minutes("9 hours or 90 min"), 90)
+
+
+def _reference_stats(description: str, history: list[dict]) -> dict:
+    """The original per-call scan over task_history, kept as the oracle."""
+    keywords = set(description.lower().split())
+    relevant = [
+        t for t in history
+        if len(keywords & set(t.get("description", "").lower().split())) >= 2
+        and t.get("actual_duration") and t.get("estimated_duration")
+    ]
+    if not relevant:
+        return {"avg_duration": None, "count": 0, "avg_estimate_accuracy": None}
+    accuracies = [t["actual_duration"] / t["estimated_duration"] for t in relevant if t["estimated_duration"] > 0]
+    avg_accuracy = sum(accuracies) / len(accuracies) if accuracies else None
+    return {
+        "avg_duration": round(sum(t["actual_duration"] for t in relevant) / len(relevant), 1),
+        "count": len(relevant),
+        "avg_estimate_accuracy": round(avg_accuracy, 2) if avg_accuracy else None,
+    }
+
+
+class HistoryIndexTest(unittest.TestCase):
+    VOCAB = "write essay report code review study math chapter email slides bug fix plan read".split()
+
+    def setUp(self):
+        conn = sqlite3.connect(database.DB_PATH)
+        conn.execute("DELETE FROM task_history")
+        conn.commit()
+        conn.close()
+        database._task_history_version += 1  # the raw DELETE bypasses save_task
+        self.rng = random.Random(3)
+
+    def _save_random_tasks(self, n: int) -> None:
+        for _ in range(n):
+            database.save_task(
+                task_id=str(uuid.uuid4()),
+                description=" ".join(self.rng.sample(self.VOCAB, self.rng.randint(1, 5))),
+                estimated_duration=self.rng.choice([0, 15, 30, 45, 60]),
+                actual_duration=self.rng.choice([None, 0, 20, 35, 50, 90]),
+            )
+
+    def _assert_matches_reference(self, description: str) -> None:
+        expected = _reference_stats(description, database.get_task_history(limit=100))
+        got = _get_historical_stats(description)
+        self.assertEqual(got["count"], expected["count"], description)
+        for key in ("avg_duration", "avg_estimate_accuracy"):
+            if expected[key] is None:
+                self.assertIsNone(got[key], description)
+            else:
+                # NumPy's pairwise mean can round the other way at an exact .x5
+                self.assertAlmostEqual(got[key], expected[key], delta=0.0101, msg=description)
+
+    def test_matches_original_scan(self):
+        self._save_random_tasks(60)
+        for _ in range(200):
+            self._assert_matches_reference(" ".join(self.rng.sample(self.VOCAB, self.rng.randint(1, 6))))
+
+    def test_index_follows_new_writes(self):
+        self._save_random_tasks(10)
+        self._assert_matches_reference("write essay report")
+        self._save_random_tasks(10)
+        self._assert_matches_reference("write essay report")
+
+    def test_no_history(self):
+        self.assertEqual(
+            _get_historical_stats("write the essay"),
+            {"avg_duration": None, "count": 0, "avg_estimate_accuracy": None},
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,58 @@
+"""
+NeuroFlow Utilities — LLM Clients
+Shared Gemini client handles so agents reuse one connection pool per config,
+plus helpers for decoding their JSON replies.
+"""
+
+import json
+import os
+import re
+from functools import lru_cache
+
+from langchain_google_genai import ChatGoogleGenerativeAI
+
+try:
+    import orjson
+except ImportError:  # optional speed-up; stdlib json is the fallback
+    orjson = None
+
+DEFAULT_MODEL = "gemini-flash-lite-latest"
+
+# Transient 429/5xx failures are retried with the client's exponential backoff;
+# the timeout bounds each attempt so a stalled call can't hang a turn
+LLM_MAX_RETRIES = int(os.environ.get("NEUROFLOW_LLM_MAX_RETRIES", "3"))
+LLM_TIMEOUT_SECONDS = float(os.environ.get("NEUROFLOW_LLM_TIMEOUT", "60"))
+
+# Strips an optional ```/```json fence around a model's JSON reply
+_CODE_FENCE_RE = re.compile(r"^\s*```(?:json)?\s*(.*?)\s*(?:```\s*)?$", re.DOTALL)
+
+
+@lru_cache(maxsize=None)
+def get_llm(
+    temperature: float, model: str = DEFAULT_MODEL, json_mode: bool = False,
+) -> ChatGoogleGenerativeAI:
+    """Return the shared client for (model, temperature, json_mode), creating it on first use.
+
+    json_mode asks Gemini for an application/json response, so replies arrive
+    as bare JSON with no markdown fence to strip.
+    """
+    return ChatGoogleGenerativeAI(
+        model=model,
+        temperature=temperature,
+        max_retries=LLM_MAX_RETRIES,
+        timeout=LLM_TIMEOUT_SECONDS,
+        response_mime_type="application/json" if json_mode else None,
+    )
+
+
+def parse_json(text: str):
+    """Decode a JSON reply, using orjson when it is installed."""
+    if orjson is not None:
+        return orjson.loads(text)
+    return json.loads(text)
+
+
+def unfence(text: str) -> str:
+    """Return the payload of a reply, without any surrounding markdown fence."""
+    m = _CODE_FENCE_RE.match(text)
+    return m.group(1) if m else text.strip()
@@ -3,9 +3,44 @@ NeuroFlow Utilities — Interaction Metrics
 Helpers for computing typing speed, detecting trends, and break suggestions.
 """
 
+import re
+import time
 from datetime import datetime
+from functools import lru_cache
 from typing import Optional
 
+# A 1-3 digit number followed by a time unit ("45 min", "2 hours") is the user's estimate
+_EST_RE = re.compile(
+    r"(?<![\d.])(\d{1,3})\s*(m|mins?|minutes?|h|hrs?|hours?)\b", re.IGNORECASE,
+)
+
+
+@lru_cache(maxsize=128)
+def iso_timestamp(timestamp: str) -> float:
+    """POSIX time of an ISO timestamp; session and task start times are re-read every rerun."""
+    return datetime.fromisoformat(timestamp).timestamp()
+
+
+def minutes_since(timestamp: str, now: Optional[float] = None) -> int:
+    """Whole minutes elapsed since an ISO timestamp."""
+    return int(((now or time.time()) - iso_timestamp(timestamp)) / 60)
+
+
+def user_estimate_minutes(text: str) -> Optional[int]:
+    """Minutes the user expects a task to take, or None if they didn't say.
+
+    A number next to a unit wins, so "5-page essay, 60 minutes" gives 60;
+    a bare number token is only used when no unit is given.
+    """
+    for m in _EST_RE.finditer(text):
+        minutes = int(m.group(1)) * (60 if m.group(2)[0] in "hH" else 1)
+        if 1 <= minutes <= 480:
+            return minutes
+    for word in text.split():
+        if word.isdigit() and 1 <= int(word) <= 480:
+            return int(word)
+    return None
+
 
 def compute_typing_speed(text: str, elapsed_seconds: float) -> float:
     """Return characters per second. Returns 0 if elapsed is ≤ 0."""
@@ -40,15 +75,13 @@ def should_suggest_break(
     Returns (should_break, minutes_since_last_rest).
     Uses `last_break` if available, otherwise `session_start`.
     """
-    now = datetime.now()
     if last_break:
-        ref = datetime.fromisoformat(last_break)
+        minutes = minutes_since(last_break)
     elif session_start:
-        ref = datetime.fromisoformat(session_start)
+        minutes = minutes_since(session_start)
     else:
         return False, 0
 
-    minutes = int((now - ref).total_seconds() / 60)
     return minutes >= threshold_minutes, minutes
 
 
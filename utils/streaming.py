@@ -0,0 +1,73 @@
+"""
+NeuroFlow Utilities — Streaming
+Helpers for agents that stream LLM JSON and surface partial output
+through LangGraph's custom stream channel.
+"""
+
+import json
+
+try:
+    from langgraph.config import get_stream_writer
+except ImportError:  # langgraph < 0.3 has no custom stream channel
+    get_stream_writer = None
+
+
+def stream_writer():
+    """LangGraph custom-stream writer for partial output, or None outside a stream."""
+    if get_stream_writer is None:
+        return None
+    try:
+        return get_stream_writer()
+    except Exception:
+        return None
+
+
+class SectionScanner:
+    """Incrementally scans streamed JSON for completed top-level keys.
+
+    feed() returns the parsed object so far (closed with a synthetic brace)
+    each time a top-level member finishes, otherwise None. Characters before
+    the first '{' (e.g. a ```json fence) are skipped.
+    """
+
+    def __init__(self) -> None:
+        self.buf = ""
+        self.pos = 0
+        self.start = -1
+        self.depth = 0
+        self.in_string = False
+        self.escape = False
+
+    def feed(self, text: str):
+        self.buf += text
+        completed_at = -1
+        buf = self.buf
+        for i in range(self.pos, len(buf)):
+            ch = buf[i]
+            if self.in_string:
+                if self.escape:
+                    self.escape = False
+                elif ch == "\\":
+                    self.escape = True
+                elif ch == '"':
+                    self.in_string = False
+            elif ch == '"':
+                self.in_string = self.start >= 0
+            elif ch in "{[":
+                if self.start < 0:
+                    if ch != "{":
+                        continue
+                    self.start = i
+                self.depth += 1
+            elif ch in "}]" and self.start >= 0:
+                self.depth -= 1
+            elif ch == "," and self.depth == 1:
+                completed_at = i
+        self.pos = len(buf)
+
+        if completed_at < 0:
+            return None
+        try:
+            return json.loads(buf[self.start:completed_at] + "}")
+        except ValueError:
+            return None
@@ -4,18 +4,54 @@ Manages persistent vector collections for tasks and interventions.
 """
 
 import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
 from typing import Optional
 import chromadb
+import numpy as np
+from chromadb.utils import embedding_functions
 
 
 CHROMA_PATH = os.path.join(os.path.dirname(__file__), "data", "chroma")
 
+# Semantic cache for context packages
+CONTEXT_CACHE_THRESHOLD = float(os.environ.get("NEUROFLOW_CONTEXT_CACHE_THRESHOLD", "0.92"))
+CONTEXT_CACHE_TTL_SECONDS = int(os.environ.get("NEUROFLOW_CONTEXT_CACHE_TTL", str(7 * 24 * 3600)))
+CONTEXT_CACHE_MAX_ENTRIES = 2000
+
+# Serialises writes now that some happen from background threads
+_WRITE_LOCK = threading.RLock()
+
+# Shared pool for fanning one query embedding out across collections
+_SEARCH_POOL = ThreadPoolExecutor(max_workers=4, thread_name_prefix="neuroflow-search")
+
+# Short-lived cache for intervention lookups; the task description they are
+# keyed on only changes at task boundaries. Any write bumps the version.
+INTERVENTION_CACHE_TTL_SECONDS = 300
+INTERVENTION_CACHE_MAX_ENTRIES = 256
+_INTERVENTION_CACHE: dict[tuple, tuple[float, int, list]] = {}
+_INTERVENTION_CACHE_LOCK = threading.Lock()
+_intervention_version = 0
+
 
 def _get_client() -> chromadb.ClientAPI:
     os.makedirs(CHROMA_PATH, exist_ok=True)
     return chromadb.PersistentClient(path=CHROMA_PATH)
 
 
+@lru_cache(maxsize=1)
+def _embedder():
+    # Same model ChromaDB uses for collections created without an explicit one
+    return embedding_functions.DefaultEmbeddingFunction()
+
+
+def embed_once(text: str) -> np.ndarray:
+    """Embed text once so several collections can be queried with the same vector."""
+    return np.asarray(_embedder()([text])[0], dtype=np.float32)
+
+
 # ---------------------------------------------------------------------------
 # Collection helpers
 # ---------------------------------------------------------------------------
@@ -36,6 +72,17 @@ def _interventions_collection():
     )
 
 
+def _context_cache_collection():
+    client = _get_client()
+    return client.get_or_create_collection(
+        name="context_package_cache",
+        metadata={
+            "description": "Cached context packages keyed by request embedding",
+            "hnsw:space": "cosine",
+        },
+    )
+
+
 # ---------------------------------------------------------------------------
 # Tasks
 # ---------------------------------------------------------------------------
@@ -44,17 +91,20 @@ def add_task_embedding(
     task_id: str,
     description: str,
     metadata: Optional[dict] = None,
+    embedding: Optional[np.ndarray] = None,
 ) -> None:
-    """Store a task description (ChromaDB auto-embeds with its default model)."""
+    """Store a task description (ChromaDB auto-embeds unless an embedding is given)."""
     col = _tasks_collection()
     meta = metadata or {}
     # ChromaDB metadata values must be str, int, float, or bool
     safe_meta = {k: str(v) for k, v in meta.items()}
-    col.upsert(
-        ids=[task_id],
-        documents=[description],
-        metadatas=[safe_meta],
-    )
+    with _WRITE_LOCK:
+        col.upsert(
+            ids=[task_id],
+            documents=[description],
+            metadatas=[safe_meta],
+            embeddings=[embedding.tolist()] if embedding is not None else None,
+        )
 
 
 def query_similar_tasks(query: str, n_results: int = 5) -> list[dict]:
@@ -63,6 +113,10 @@ def query_similar_tasks(query: str, n_results: int = 5) -> list[dict]:
     if col.count() == 0:
         return []
     results = col.query(query_texts=[query], n_results=min(n_results, col.count()))
+    return _task_rows(results)
+
+
+def _task_rows(results: dict) -> list[dict]:
     tasks = []
     for i, doc_id in enumerate(results["ids"][0]):
         tasks.append({
@@ -74,6 +128,117 @@ def query_similar_tasks(query: str, n_results: int = 5) -> list[dict]:
     return tasks
 
 
+# ---------------------------------------------------------------------------
+# Multi-collection search
+# ---------------------------------------------------------------------------
+
+def multi_collection_search(embedding: np.ndarray, specs: dict) -> dict:
+    """Query several collections with one embedding, concurrently.
+
+    ``specs`` maps a collection getter to its ``query`` kwargs (``n_results``,
+    optional ``where``). Returns raw ChromaDB results per getter, or None for
+    an empty collection.
+    """
+    query_embeddings = [embedding.tolist()]
+
+    def _search(getter, kwargs):
+        col = getter()
+        count = col.count()
+        if count == 0:
+            return None
+        kwargs = {**kwargs, "n_results": min(kwargs.get("n_results", 5), count)}
+        return col.query(query_embeddings=query_embeddings, **kwargs)
+
+    futures = {
+        getter: _SEARCH_POOL.submit(_search, getter, kwargs)
+        for getter, kwargs in specs.items()
+    }
+    return {getter: fut.result() for getter, fut in futures.items()}
+
+
+# ---------------------------------------------------------------------------
+# Context package cache
+# ---------------------------------------------------------------------------
+
+def search_task_context(
+    embedding: np.ndarray,
+    buckets: dict,
+    n_tasks: int = 3,
+    threshold: float = CONTEXT_CACHE_THRESHOLD,
+) -> tuple[Optional[str], list[dict]]:
+    """Look up a cached context package and similar past tasks in one fan-out.
+
+    A cache hit needs cosine similarity >= threshold and the same state
+    buckets (energy, time of day, ...) as the stored entry. Returns
+    ``(context_package_json or None, similar_tasks)``; the package stays a
+    JSON string so the caller can parse it straight into its schema.
+    """
+    where = {k: str(v) for k, v in buckets.items()}
+    if len(where) > 1:
+        where = {"$and": [{k: v} for k, v in where.items()]}
+    results = multi_collection_search(embedding, {
+        _context_cache_collection: {"n_results": 1, "where": where or None},
+        _tasks_collection: {"n_results": n_tasks},
+    })
+    tasks = results[_tasks_collection]
+    similar_tasks = _task_rows(tasks) if tasks else []
+    return _context_cache_hit(results[_context_cache_collection], threshold), similar_tasks
+
+
+def _context_cache_hit(results: Optional[dict], threshold: float) -> Optional[str]:
+    if not results or not results["ids"][0]:
+        return None
+
+    doc_id = results["ids"][0][0]
+    meta = results["metadatas"][0][0]
+    similarity = 1.0 - results["distances"][0][0]
+    now = time.time()
+    col = _context_cache_collection()
+    if now - float(meta.get("created_at", 0)) > CONTEXT_CACHE_TTL_SECONDS:
+        # Same lock as the writer so expiry can't race its LRU eviction
+        with _WRITE_LOCK:
+            col.delete(ids=[doc_id])
+        return None
+    if similarity < threshold:
+        return None
+
+    with _WRITE_LOCK:
+        col.update(ids=[doc_id], metadatas=[{**meta, "last_used": now}])
+    return meta["context_package"]
+
+
+def cache_context_package(
+    query: str,
+    buckets: dict,
+    context_package_json: str,
+    embedding: Optional[np.ndarray] = None,
+) -> None:
+    """Store a serialised context package under the request text; evicts LRU entries past the cap."""
+    with _WRITE_LOCK:
+        col = _context_cache_collection()
+        now = time.time()
+        col.upsert(
+            ids=[f"ctx-{now:.6f}"],
+            documents=[query],
+            embeddings=[embedding.tolist()] if embedding is not None else None,
+            metadatas=[{
+                **{k: str(v) for k, v in buckets.items()},
+                "context_package": context_package_json,
+                "created_at": now,
+                "last_used": now,
+            }],
+        )
+
+        overflow = col.count() - CONTEXT_CACHE_MAX_ENTRIES
+        if overflow > 0:
+            entries = col.get(include=["metadatas"])
+            by_age = sorted(
+                zip(entries["ids"], entries["metadatas"]),
+                key=lambda e: e[1].get("last_used", 0),
+            )
+            col.delete(ids=[doc_id for doc_id, _ in by_age[:overflow]])
+
+
 # ---------------------------------------------------------------------------
 # Interventions
 # ---------------------------------------------------------------------------
@@ -85,6 +250,7 @@ def add_intervention(
     success: bool = False,
     context: str = "",
 ) -> None:
+    global _intervention_version
     col = _interventions_collection()
     col.upsert(
         ids=[intervention_id],
@@ -95,11 +261,40 @@ def add_intervention(
             "context": context,
         }],
     )
+    with _INTERVENTION_CACHE_LOCK:
+        _intervention_version += 1
 
 
 def query_similar_interventions(
     query: str, n_results: int = 3
 ) -> list[dict]:
+    key = (query, n_results)
+    now = time.time()
+    with _INTERVENTION_CACHE_LOCK:
+        version = _intervention_version
+        hit = _INTERVENTION_CACHE.get(key)
+    if hit is not None and hit[0] > now and hit[1] == version:
+        return hit[2]
+
+    interventions = _query_interventions(query, n_results)
+    with _INTERVENTION_CACHE_LOCK:
+        if key not in _INTERVENTION_CACHE and len(_INTERVENTION_CACHE) >= INTERVENTION_CACHE_MAX_ENTRIES:
+            del _INTERVENTION_CACHE[next(iter(_INTERVENTION_CACHE))]
+        _INTERVENTION_CACHE[key] = (now + INTERVENTION_CACHE_TTL_SECONDS, version, interventions)
+    return interventions
+
+
+def prefetch_similar_interventions(query: str, n_results: int = 3) -> None:
+    """Warm the intervention cache for a new task without blocking the caller."""
+    def _warm():
+        try:
+            query_similar_interventions(query, n_results)
+        except Exception:
+            pass
+    _SEARCH_POOL.submit(_warm)
+
+
+def _query_interventions(query: str, n_results: int) -> list[dict]:
     col = _interventions_collection()
     if col.count() == 0:
         return []